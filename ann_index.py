@@ -0,0 +1,209 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index over stored embeddings
+"""
+import os
+import json
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) centroids for unit-length rows"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Re-seed empty clusters from random points so every partition stays in use
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty))]
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Vectors grouped by nearest centroid; queries scan only the nprobe closest partitions
+
+    Scores are cosine similarities. Vectors are stored partition by partition in
+    a .npy file that is memory-mapped on load, so the index need not fit in RAM.
+    """
+
+    CENTROIDS_FILE = "ivf_centroids.npy"
+    VECTORS_FILE = "ivf_vectors.npy"
+    META_FILE = "ivf_index.json"
+    # Rows per chunk when streaming vectors through assignment and exact search
+    CHUNK_ROWS = 65536
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, vectors: np.ndarray, ids: List[str]):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_partitions(self) -> int:
+        return len(self.centroids)
+
+    @staticmethod
+    def default_partitions(count: int) -> int:
+        """About 4 * sqrt(n) partitions, the usual IVF starting point"""
+        return max(1, min(count, int(4 * np.sqrt(count))))
+
+    @classmethod
+    def build(cls, directory: str, batches: Iterable[Tuple[List[str], Sequence]], count: int,
+              n_partitions: int = 0, centroids: Optional[np.ndarray] = None,
+              iterations: int = 10, sample_per_partition: int = 256, seed: int = 0) -> "IVFIndex":
+        """Build and save an index from (ids, vectors) batches holding count vectors in total
+
+        Passing existing centroids skips clustering and only reassigns vectors,
+        which is how incremental syncs keep the index current cheaply.
+        """
+        staging_path = os.path.join(directory, f"{cls.VECTORS_FILE}.staging")
+        ids: List[str] = []
+        staging = None
+        for batch_ids, batch_vectors in batches:
+            batch = _normalize_rows(np.asarray(batch_vectors, dtype=np.float32))
+            if staging is None:
+                staging = np.lib.format.open_memmap(staging_path, mode="w+", dtype=np.float32,
+                                                    shape=(max(count, 1), batch.shape[1]))
+            staging[len(ids):len(ids) + len(batch)] = batch
+            ids.extend(batch_ids)
+        if staging is None:
+            raise ValueError("Cannot build an ANN index from an empty collection")
+        count = len(ids)
+
+        if centroids is None or centroids.shape[1] != staging.shape[1]:
+            n_partitions = min(n_partitions or cls.default_partitions(count), count)
+            rng = np.random.default_rng(seed)
+            sample_size = min(count, n_partitions * sample_per_partition)
+            sample = np.asarray(staging[np.sort(rng.choice(count, sample_size, replace=False))])
+            centroids = kmeans(sample, n_partitions, iterations, seed)
+
+        assignments = np.empty(count, dtype=np.int32)
+        for start in range(0, count, cls.CHUNK_ROWS):
+            chunk = np.asarray(staging[start:start + cls.CHUNK_ROWS])
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+        vectors_path = os.path.join(directory, cls.VECTORS_FILE)
+        vectors = np.lib.format.open_memmap(f"{vectors_path}.tmp", mode="w+", dtype=np.float32,
+                                            shape=(count, staging.shape[1]))
+        for start in range(0, count, cls.CHUNK_ROWS):
+            # Gather in ascending row order so reads from the staging file stay sequential
+            chunk_order = order[start:start + cls.CHUNK_ROWS]
+            rows = np.sort(chunk_order)
+            vectors[start:start + len(rows)] = staging[rows][np.searchsorted(rows, chunk_order)]
+        vectors.flush()
+        del vectors, staging
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.remove(staging_path)
+
+        index = cls(centroids, offsets.astype(np.int64), np.load(vectors_path, mmap_mode="r"),
+                    [ids[i] for i in order])
+        index.save(directory)
+        return index
+
+    def save(self, directory: str):
+        """Write centroids and metadata; the vectors file is written by build()"""
+        np.save(os.path.join(directory, self.CENTROIDS_FILE), self.centroids)
+        with open(os.path.join(directory, self.META_FILE), "w") as f:
+            json.dump({"offsets": self.offsets.tolist(), "ids": self.ids}, f)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IVFIndex"]:
+        paths = [os.path.join(directory, name) for name in (cls.CENTROIDS_FILE, cls.VECTORS_FILE, cls.META_FILE)]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        with open(paths[2], "r") as f:
+            meta = json.load(f)
+        return cls(np.load(paths[0]), np.asarray(meta["offsets"], dtype=np.int64),
+                   np.load(paths[1], mmap_mode="r"), meta["ids"])
+
+    def search(self, query, k: int, nprobe: int = 8) -> List[Tuple[str, float]]:
+        """Top-k (id, cosine similarity) pairs from the nprobe partitions nearest the query"""
+        query = _normalize_rows(np.asarray(query, dtype=np.float32)[None, :])[0]
+        nprobe = min(nprobe, self.n_partitions)
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        positions, scores = [], []
+        for partition in probes:
+            start, end = self.offsets[partition], self.offsets[partition + 1]
+            if end > start:
+                positions.append(np.arange(start, end))
+                scores.append(self.vectors[start:end] @ query)
+        if not positions:
+            return []
+        return self._top_k(np.concatenate(positions), np.concatenate(scores), k)
+
+    def exact_search(self, query, k: int) -> List[Tuple[str, float]]:
+        """Brute-force top-k over every vector, the ground truth for recall"""
+        query = _normalize_rows(np.asarray(query, dtype=np.float32)[None, :])[0]
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), self.CHUNK_ROWS):
+            scores[start:start + self.CHUNK_ROWS] = self.vectors[start:start + self.CHUNK_ROWS] @ query
+        return self._top_k(np.arange(len(self.ids)), scores, k)
+
+    def _top_k(self, positions: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[positions[i]], float(scores[i])) for i in top]
+
+    def evaluate(self, queries: np.ndarray, k: int = 5, nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32)) -> List[dict]:
+        """Recall@k and latency percentiles per nprobe, measured against exact search"""
+        def timed(search):
+            results, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                results.append({doc_id for doc_id, _ in search(query)})
+                latencies.append(time.perf_counter() - start)
+            return results, np.asarray(latencies) * 1000
+
+        truth, exact_ms = timed(lambda query: self.exact_search(query, k))
+        report = [{"nprobe": "exact", "recall": 1.0,
+                   "p50_ms": float(np.percentile(exact_ms, 50)), "p99_ms": float(np.percentile(exact_ms, 99))}]
+        for nprobe in nprobes:
+            if nprobe > self.n_partitions:
+                break
+            found, ms = timed(lambda query: self.search(query, k, nprobe))
+            recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth) if t])
+            report.append({"nprobe": nprobe, "recall": float(recall),
+                           "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99))})
+        return report
+
+
+class ANNVectorSearch:
+    """similarity_search/get_by_ids backed by an IVF index
+
+    Documents are still fetched from the project's vector backend; only the
+    nearest neighbour search moves to the IVF index.
+    """
+
+    def __init__(self, vector_store, index: IVFIndex, nprobe: int = 8):
+        self.vector_store = vector_store
+        self.index = index
+        self.nprobe = nprobe
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        vector = self.vector_store.embeddings.embed_query(query)
+        return self.get_by_ids([doc_id for doc_id, _ in self.index.search(vector, k, self.nprobe)])
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        """Documents in the order of ids"""
+        found = {doc.id: doc for doc in self.vector_store.get_by_ids(ids)}
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+
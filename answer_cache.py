@@ -0,0 +1,179 @@
+"""
+Semantic answer cache: reuse generated answers for near-duplicate questions
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Cache of (question embedding, answer) pairs matched by cosine similarity
+
+    Answers are only reused within the same project and index version. Entries
+    are evicted least recently used first. With a path, every stored answer is
+    appended to a JSON lines log that is replayed on startup and compacted when
+    it grows past twice max_entries.
+    """
+
+    HISTOGRAM_BUCKETS = 20
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, path: Optional[str] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # Best-match similarity of every lookup, for tuning the threshold
+        self.histogram = np.zeros(self.HISTOGRAM_BUCKETS, dtype=np.int64)
+        self.recent_similarities = deque(maxlen=1000)
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._partitions: Dict[Tuple[str, str], dict] = {}
+        self._next_id = 0
+        self._log_lines = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, project_name: str, index_version: str, embedding) -> Optional[dict]:
+        """Return the closest cached entry if it is within the threshold, else None"""
+        query = self._normalize(embedding)
+        with self._lock:
+            partition = self._partitions.get((project_name, index_version))
+            best_similarity, best_id = -1.0, None
+            if partition and partition["ids"]:
+                similarities = self._matrix(partition) @ query
+                best = int(np.argmax(similarities))
+                best_similarity, best_id = float(similarities[best]), partition["ids"][best]
+                self._record_similarity(best_similarity)
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry = self._entries[best_id]
+            entry["last_used"] = time.time()
+            self._entries.move_to_end(best_id)
+            return {**entry, "similarity": best_similarity}
+
+    def store(self, project_name: str, index_version: str, question: str, embedding, answer: str,
+              extra: Optional[dict] = None):
+        """Cache an answer for a question embedding"""
+        entry = {
+            "project": project_name,
+            "index_version": index_version,
+            "question": question,
+            "answer": answer,
+            "extra": extra or {},
+            "embedding": self._normalize(embedding),
+            "last_used": time.time(),
+        }
+        with self._lock:
+            self._insert(entry)
+            if self.path:
+                self._append(entry)
+
+    def _insert(self, entry: dict):
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        partition = self._partitions.setdefault((entry["project"], entry["index_version"]),
+                                                {"ids": [], "matrix": None})
+        partition["ids"].append(entry_id)
+        partition["matrix"] = None
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        key = (entry["project"], entry["index_version"])
+        partition = self._partitions[key]
+        partition["ids"].remove(entry_id)
+        partition["matrix"] = None
+        if not partition["ids"]:
+            del self._partitions[key]
+
+    def _matrix(self, partition: dict) -> np.ndarray:
+        """Stacked embeddings for a partition, rebuilt lazily after inserts and evictions"""
+        if partition["matrix"] is None:
+            partition["matrix"] = np.stack([self._entries[i]["embedding"] for i in partition["ids"]])
+        return partition["matrix"]
+
+    def _record_similarity(self, similarity: float):
+        bucket = min(self.HISTOGRAM_BUCKETS - 1, max(0, int(similarity * self.HISTOGRAM_BUCKETS)))
+        self.histogram[bucket] += 1
+        self.recent_similarities.append(similarity)
+
+    def invalidate(self, project_name: str):
+        """Drop every cached answer for a project"""
+        with self._lock:
+            for entry_id in [i for i, e in self._entries.items() if e["project"] == project_name]:
+                self._remove(entry_id)
+            if self.path:
+                self._compact()
+
+    # Persistence
+
+    @staticmethod
+    def _serialize(entry: dict) -> str:
+        return json.dumps({**entry, "embedding": entry["embedding"].tolist()})
+
+    def _append(self, entry: dict):
+        with open(self.path, "a") as f:
+            f.write(self._serialize(entry) + "\n")
+        self._log_lines += 1
+        if self._log_lines > 2 * self.max_entries:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log with only the live entries"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            for entry in self._entries.values():
+                f.write(self._serialize(entry) + "\n")
+        os.replace(tmp_path, self.path)
+        self._log_lines = len(self._entries)
+
+    def _load(self):
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                record["embedding"] = np.asarray(record["embedding"], dtype=np.float32)
+                self._insert(record)
+                self._log_lines += 1
+
+    # Reporting
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            similarities = np.asarray(self.recent_similarities)
+            percentiles = (
+                dict(zip(("p10", "p50", "p90", "p99"), np.percentile(similarities, [10, 50, 90, 99]).round(4).tolist()))
+                if len(similarities) else {}
+            )
+            width = 1.0 / self.HISTOGRAM_BUCKETS
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "similarity_percentiles": percentiles,
+                "similarity_histogram": {
+                    f"{i * width:.2f}-{(i + 1) * width:.2f}": int(count)
+                    for i, count in enumerate(self.histogram) if count
+                },
+            }
@@ -2,82 +2,515 @@
 Base project class for handling different types of RAG projects
 """
 import os
+import copy
+import json
+import time
+import hashlib
 import pandas as pd
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from abc import ABC, abstractmethod
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
-import shutil
+from model_backends import DEFAULT_EMBEDDING_MODEL, create_embeddings
+from ingest_pipeline import DuplicateWriter, IngestPipeline
+from lexical_index import BM25Index, HybridRetriever, LexicalIndexBuilder
+from ann_index import ANNVectorSearch, IVFIndex
+from vector_backends import VectorBackend, VectorSearchRetriever, open_backend
+from metrics import span
+from context_builder import ContextBuilder, PackedContext
+from reranker import RerankingRetriever
+from prompt_layout import prefix_stable
+import store_versions
 
 
 class BaseProject(ABC):
     """Base class for all project types"""
+
+    embedding_model = DEFAULT_EMBEDDING_MODEL
+    # Storage for embedded documents: "chroma", or "flat" for an in-process memory-mapped matrix
+    vector_backend = "chroma"
+    # "dense" uses the vector backend's similarity search only; "hybrid" fuses it with the BM25 index
+    retrieval_mode = "dense"
+    # Fields ("page_content" or a metadata key) whose exact value answers a query without embedding it
+    exact_match_fields: List[str] = []
+    # Search an IVF index built from the stored embeddings instead of the backend's own search
+    use_ann_index = False
+    # IVF partitions (0 picks about 4 * sqrt(rows)) and partitions scanned per query
+    ann_partitions = 0
+    ann_nprobe = 8
+    # Prompt context size in estimated tokens (0 = unlimited) and the metadata fields the prompt uses
+    context_token_budget = 0
+    context_metadata_fields: List[str] = []
+    # "inline" keeps the prompt as written; "prefix" moves the {responses} and {question} sections
+    # to the end so the instructions are an identical, server-cacheable prefix on every query
+    prompt_layout = "inline"
+    # Over-fetch this many candidates and re-rank them to k by maximal marginal relevance (0 = off);
+    # mmr_lambda weighs relevance (1.0) against diversity (0.0)
+    rerank_fetch_k = 0
+    mmr_lambda = 0.7
+    # Metadata key shared by near-duplicate rows, such as sections of one guide, and how many
+    # re-ranked results may share a value (None = no collapsing)
+    group_key: Optional[str] = None
+    max_per_group = 1
+    # Columns (names or positions) identifying one logical row; later rows with the same values
+    # anywhere in data.csv are dropped before documents are built
+    duplicate_row_columns: List = []
+    # Columns (names or positions) whose values identify a row across edits of data.csv; without
+    # them a row is identified by a hash of its document, so an edited row is deleted and re-added
+    id_columns: List = []
     
     def __init__(self, project_name: str, project_dir: str):
         self.project_name = project_name
         self.project_dir = project_dir
         self.csv_file = os.path.join(project_dir, "data.csv")
         self.prompt_file = os.path.join(project_dir, "prompt.txt")
-        self.db_location = f"./chrome_langchain_db_{project_name}"
-        self.embeddings = OllamaEmbeddings(model="mxbai-embed-large")
+        # The live store: ./chrome_langchain_db_<name>, or the versioned directory its pointer names
+        self.db_location = store_versions.live_location(f"./chrome_langchain_db_{project_name}")
+        self.last_ingest_stats = None
+        # {"changed", "deleted", "unchanged"} document counts of the last incremental sync
+        self.last_sync_stats = None
+        # Backends opened by this project, by directory, so a retired store can be closed before removal
+        self._backends: Dict[str, VectorBackend] = {}
+        self._prompt_cache = None
+        # The ProjectManager that loaded this project, whose rebuild() drains queries before removing a store
+        self.manager = None
+        self.embeddings = create_embeddings(self.embedding_model)
         
     @abstractmethod
     def process_row(self, row: pd.Series, index: int) -> Document:
         """Process a single CSV row into a Document object"""
         pass
     
+    def process_frame(self, df: pd.DataFrame) -> List[Document]:
+        """Process a chunk of CSV rows into Documents
+
+        Falls back to process_row per row; override with column-wise pandas
+        operations for large datasets.
+        """
+        return [self.process_row(row, i) for i, row in df.iterrows()]
+
+    @staticmethod
+    def frame_metadata(columns: Dict[str, pd.Series]) -> List[dict]:
+        """Column-wise metadata dicts, dropping empty or 'nan' values like the per-row cleanup"""
+        values = {}
+        for key, series in columns.items():
+            text = series.astype(str)
+            keep = (text != 'nan') & (text.str.strip() != '')
+            values[key] = text.where(keep, None).tolist()
+        keys = list(values)
+        return [
+            {k: v for k, v in zip(keys, row) if v is not None}
+            for row in zip(*values.values())
+        ]
+
     @abstractmethod
     def get_prompt_template(self) -> ChatPromptTemplate:
         """Return the chat prompt template for this project"""
         pass
+
+    def prompt_template(self) -> ChatPromptTemplate:
+        """get_prompt_template() in this project's prompt_layout, compiled once until prompt.txt changes
+
+        Each call costs one stat() of prompt.txt instead of reading and parsing it.
+        """
+        try:
+            stat = os.stat(self.prompt_file)
+            signature = (stat.st_mtime_ns, stat.st_size, self.prompt_layout)
+        except OSError:
+            signature = (None, None, self.prompt_layout)
+        cached = self._prompt_cache
+        if cached is None or cached[0] != signature:
+            with span("query.prompt_compile"):
+                template = self.get_prompt_template()
+                if self.prompt_layout == "prefix":
+                    template = prefix_stable(template)
+            cached = self._prompt_cache = (signature, template)
+        return cached[1]
+
+    def invalidate_prompt_template(self):
+        """Drop the compiled prompt so the next query re-reads prompt.txt"""
+        self._prompt_cache = None
     
-    def create_vector_store(self, force_refresh: bool = False):
-        """Create vector store from CSV data"""
+    def create_vector_store(self, force_refresh: bool = False, incremental: bool = False,
+                            embedding_slots=None):
+        """Create vector store from CSV data
+
+        With incremental=True an existing store is synced in place: only new or
+        changed documents are embedded and ids that disappeared are deleted.
+        force_refresh builds a new store beside the live one (build_staged_store)
+        and activates it. With a manager this goes through ProjectManager.rebuild,
+        which removes the old store once its queries drain; otherwise the old
+        store is left for sweep_stores().
+        data.csv is streamed in chunks, so memory stays flat regardless of file size.
+        embedding_slots is an optional semaphore shared between concurrent builds
+        to cap total in-flight embedding requests.
+        """
         if not os.path.exists(self.csv_file):
             raise FileNotFoundError(f"CSV file not found: {self.csv_file}")
-            
-        df = pd.read_csv(self.csv_file)
-        
-        # Delete existing vector store if force_refresh is True
-        if force_refresh and os.path.exists(self.db_location):
-            print(f"Deleting existing vector store: {self.db_location}")
-            shutil.rmtree(self.db_location)
 
-        add_documents = not os.path.exists(self.db_location)
+        if force_refresh:
+            if self.manager is not None:
+                self.manager.rebuild(self.project_name, embedding_slots)
+                return self.manager.retrievers[self.project_name]
+            location, retriever = self.build_staged_store(embedding_slots)
+            self.activate_store(location)
+            return retriever
+
+        backend = self.open_backend()
+        self._backends[self.db_location] = backend
+
+        self.last_ingest_stats = None
+        if not backend.exists():
+            hashes = {}
+            counts = {}
+            lexical = self._lexical_builder()
+            documents = self._hashed(self.iter_documents(counts), hashes)
+            self._add_documents(backend, lexical.tap(documents) if lexical else documents,
+                                embedding_slots, counts)
+            with span("ingest.persist"):
+                backend.persist()
+            self._save_content_hashes(hashes)
+            self._save_lexical_index(lexical)
+            if self.use_ann_index:
+                self.build_ann_index(backend)
+        elif incremental:
+            self._sync_documents(backend, embedding_slots)
+            if self.use_ann_index:
+                self.build_ann_index(backend, reuse_centroids=True)
         
-        if add_documents:
-            documents = []
-            ids = []
-            
-            for i, row in df.iterrows():
-                doc = self.process_row(row, i)
-                documents.append(doc)
-                ids.append(str(i))
-            
-            # Initialize vector store
-            vector_store = Chroma(
-                collection_name=self.project_name,
-                persist_directory=self.db_location,
-                embedding_function=self.embeddings
-            )
-            
-            # Batch insertion for large datasets
-            batch_size = self.get_batch_size()
-            for start in range(0, len(documents), batch_size):
-                end = start + batch_size
-                batch_docs = documents[start:end]
-                batch_ids = ids[start:end]
-                vector_store.add_documents(documents=batch_docs, ids=batch_ids)
+        return self.build_retriever(backend)
+
+    def build_staged_store(self, embedding_slots=None) -> Tuple[str, object]:
+        """Build a complete new store next to the live one and check it; returns (directory, retriever)
+
+        The live store and db_location are left alone, so queries keep being
+        served from them. A staged store that fails to build or fails
+        check_store() is deleted and the error re-raised.
+        """
+        location = store_versions.staging_location(self.db_location)
+        builder = copy.copy(self)
+        builder.db_location = location
+        try:
+            retriever = builder.create_vector_store(embedding_slots=embedding_slots)
+            with span("ingest.sanity_check"):
+                builder.check_store(self._backends[location], retriever)
+        except Exception:
+            self.remove_store(location)
+            raise
+        finally:
+            self.last_ingest_stats = builder.last_ingest_stats
+        return location, retriever
+
+    def check_store(self, backend: VectorBackend, retriever):
+        """Raise ValueError if a freshly built store can't serve queries; runs before it goes live"""
+        stored = backend.count()
+        expected = self.last_ingest_stats.rows if self.last_ingest_stats else 0
+        if stored == 0 or stored < expected:
+            raise ValueError(f"New store for {self.project_name} holds {stored} documents, expected {expected}")
+        _, vectors = next(iter(backend.iter_vectors(1)))
+        probe = backend.similarity_search_by_vector(vectors[0], 1)
+        if not probe:
+            raise ValueError(f"New store for {self.project_name} returned nothing for a stored vector")
+        text = probe[0].page_content[:200]
+        if text and not retriever.invoke(text):
+            raise ValueError(f"New retriever for {self.project_name} returned nothing for a stored text")
+
+    def activate_store(self, location: str) -> Optional[str]:
+        """Make a staged store the live one; returns the directory it replaced, to remove once drained"""
+        previous = store_versions.activate(location)
+        self.db_location = location
+        return previous
+
+    def remove_store(self, location: str):
+        """Close and delete a store directory that no longer serves queries"""
+        backend = self._backends.pop(location, None)
+        if backend is not None:
+            backend.close()
+        store_versions.remove(location)
+
+    def sweep_stores(self, keep: Iterable[str] = ()):
+        """Delete store directories older than the live one, such as those of killed rebuilds
+
+        keep lists retired stores whose queries haven't drained yet. Only this
+        process's queries are known, so this must not run while another process
+        may still be serving from the same store root.
+        """
+        for location in store_versions.sweep(store_versions.store_root(self.db_location), keep):
+            print(f"✓ Removed unused vector store for {self.project_name}: {location}")
+
+    def open_backend(self) -> VectorBackend:
+        """Open this project's vector_backend at db_location"""
+        return open_backend(self.vector_backend, self.project_name, self.db_location, self.embeddings)
+
+    def build_retriever(self, backend: VectorBackend, k: int = 5):
+        """Retriever for this project's retrieval_mode, re-ranked for diversity if rerank_fetch_k is set"""
+        fetch_k = max(k, self.rerank_fetch_k)
+        dense = backend
+        if self.use_ann_index:
+            dense = ANNVectorSearch(backend, self.load_ann_index(backend), self.ann_nprobe)
+        if self.retrieval_mode == "hybrid":
+            retriever = HybridRetriever(vector_store=dense, lexical_index=self.load_lexical_index(),
+                                        search_kwargs={"k": fetch_k}, fetch_k=max(20, fetch_k))
+        elif self.use_ann_index:
+            retriever = VectorSearchRetriever(vector_search=dense, search_kwargs={"k": fetch_k})
         else:
-            vector_store = Chroma(
-                collection_name=self.project_name,
-                persist_directory=self.db_location,
-                embedding_function=self.embeddings
-            )
-        
-        return vector_store.as_retriever(search_kwargs={"k": 5})
+            retriever = backend.as_retriever(search_kwargs={"k": fetch_k})
+        if not self.rerank_fetch_k:
+            return retriever
+        return RerankingRetriever(retriever=retriever, vector_store=backend, search_kwargs={"k": k},
+                                  lambda_mult=self.mmr_lambda, group_key=self.group_key,
+                                  max_per_group=self.max_per_group)
+
+    def build_ann_index(self, backend: VectorBackend, reuse_centroids: bool = False) -> IVFIndex:
+        """Cluster the stored embeddings into an IVF index saved next to the store
+
+        With reuse_centroids the existing partitions are kept and vectors are only
+        reassigned, avoiding a k-means run after small incremental syncs.
+        """
+        start = time.perf_counter()
+        centroids = None
+        if reuse_centroids:
+            existing = IVFIndex.load(self.db_location)
+            centroids = existing.centroids if existing is not None else None
+        with span("ingest.ann_index"):
+            index = IVFIndex.build(self.db_location, backend.iter_vectors(self.get_batch_size()),
+                                   backend.count(), n_partitions=self.ann_partitions, centroids=centroids)
+        print(f"Built ANN index for {self.project_name}: {len(index)} vectors in "
+              f"{index.n_partitions} partitions ({time.perf_counter() - start:.1f}s)")
+        return index
+
+    def load_ann_index(self, backend: VectorBackend) -> IVFIndex:
+        """Load the IVF index saved next to the vector store, building it if missing"""
+        index = IVFIndex.load(self.db_location)
+        if index is None:
+            index = self.build_ann_index(backend)
+        return index
+
+    def build_context(self, documents: List[Document]) -> PackedContext:
+        """Deduplicate retrieved documents and pack them into the project's context token budget"""
+        return ContextBuilder(self.context_token_budget, self.context_metadata_fields,
+                              self.group_key).build(documents)
+
+    def _lexical_builder(self) -> Optional[LexicalIndexBuilder]:
+        """Builder to tap during ingest for hybrid projects; None keeps dense ingests from holding term counts"""
+        if self.retrieval_mode != "hybrid":
+            return None
+        return LexicalIndexBuilder(self.exact_match_fields)
+
+    def _save_lexical_index(self, lexical: Optional[LexicalIndexBuilder]):
+        """Save the index tapped during ingest, or drop a now stale one for load_lexical_index() to rebuild"""
+        with span("ingest.lexical_index"):
+            if lexical is not None:
+                lexical.build().save(self.db_location)
+            else:
+                BM25Index.discard(self.db_location)
+
+    def load_lexical_index(self) -> BM25Index:
+        """Load the BM25 index saved next to the vector store, building it from data.csv if missing"""
+        index = BM25Index.load(self.db_location)
+        if index is None:
+            print(f"Building lexical index for {self.project_name}...")
+            lexical = LexicalIndexBuilder(self.exact_match_fields)
+            for _ in lexical.tap(self.iter_documents()):
+                pass
+            index = lexical.build()
+            index.save(self.db_location)
+        return index
+
+    def preprocess_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Clean a chunk of CSV rows before documents are built; rows it drops are not ingested"""
+        return df
+
+    def iter_documents(self, counts: Optional[dict] = None) -> Iterator[Tuple[str, Document]]:
+        """Stream (id, Document) pairs from data.csv one chunk at a time
+
+        Each chunk goes through preprocess_data() and duplicate_row_columns
+        filtering first. Ids come from id_columns, or from each document's
+        content hash, so inserting or deleting a row leaves the other rows' ids
+        alone; a repeated id gets a "-2", "-3", ... suffix. Rows removed are
+        added to counts["skipped_rows"] if counts is given.
+        """
+        chunks = iter(pd.read_csv(self.csv_file, chunksize=self.get_csv_chunk_size()))
+        seen_rows = set()
+        seen_ids = set()
+        while True:
+            with span("ingest.csv_parse"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            with span("ingest.preprocess"):
+                rows = len(chunk)
+                chunk = self.preprocess_data(chunk)
+                if self.duplicate_row_columns:
+                    chunk = self._drop_seen_rows(chunk, seen_rows)
+            if counts is not None:
+                counts["skipped_rows"] = counts.get("skipped_rows", 0) + rows - len(chunk)
+            with span("ingest.process_frame"):
+                documents = self.process_frame(chunk)
+            if self.id_columns:
+                keys = self._row_keys(chunk, self.id_columns).tolist()
+            else:
+                keys = [self.content_hash(doc)[:32] for doc in documents]
+            for key, doc in zip(keys, documents):
+                doc_id = str(key)
+                if doc_id in seen_ids:
+                    n = 2
+                    while f"{doc_id}-{n}" in seen_ids:
+                        n += 1
+                    doc_id = f"{doc_id}-{n}"
+                seen_ids.add(doc_id)
+                doc.id = doc_id
+                yield doc_id, doc
+
+    @staticmethod
+    def _row_keys(df: pd.DataFrame, column_spec: List) -> pd.Series:
+        """64-bit hash per row of the given columns' values as text"""
+        # Integers not used as column names are positions (the subject guides CSV has no header)
+        columns = [c if c in df.columns else df.columns[c]
+                   for c in column_spec if c in df.columns or isinstance(c, int) and c < df.shape[1]]
+        # Hashing text keeps keys stable when a chunk infers a different dtype for a column
+        return pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+
+    def _drop_seen_rows(self, df: pd.DataFrame, seen: set) -> pd.DataFrame:
+        """Drop rows whose duplicate_row_columns values appeared earlier in this chunk or a previous one"""
+        keys = self._row_keys(df, self.duplicate_row_columns)
+        keep = ~keys.duplicated() & ~keys.isin(seen)
+        seen.update(keys[keep].tolist())
+        return df[keep.values]
+
+    def _hashed(self, documents: Iterable[Tuple[str, Document]], hashes: dict):
+        """Pass documents through while recording their content hashes"""
+        for doc_id, doc in documents:
+            hashes[doc_id] = self.content_hash(doc)
+            yield doc_id, doc
+
+    def _add_documents(self, backend: VectorBackend, documents: Iterable[Tuple[str, Document]],
+                       embedding_slots=None, counts: Optional[dict] = None):
+        """Embed and insert (id, Document) pairs in batches through the ingest pipeline
+
+        Each distinct page_content is embedded once; later documents with the same
+        text are written in batches, as soon as the first one's vector is stored,
+        with that vector under their own id and metadata. counts carries
+        skipped_rows from iter_documents().
+        """
+        duplicates = DuplicateWriter(backend.upsert, backend.get_vectors, self.get_batch_size())
+        pipeline = IngestPipeline(
+            self.embeddings,
+            duplicates.write,
+            concurrency=self.get_embedding_concurrency(),
+            embedding_slots=embedding_slots
+        )
+        # Batch insertion for large datasets
+        stats = pipeline.run(self._batched(self._unique_content(documents, duplicates), self.get_batch_size()))
+        with span("ingest.duplicates"):
+            duplicates.finish()
+        stats.rows += duplicates.rows
+        stats.duplicates = duplicates.rows
+        stats.skipped_rows = (counts or {}).get("skipped_rows", 0)
+        stats.elapsed = time.perf_counter() - stats.started
+        self.last_ingest_stats = stats
+        if stats.rows or stats.skipped_rows:
+            print(f"Ingested {self.project_name}: {stats.summary()}")
+        return stats
+
+    @staticmethod
+    def _unique_content(documents: Iterable[Tuple[str, Document]], duplicates: DuplicateWriter):
+        """Pass through the first document with each page_content, handing repeats to duplicates"""
+        first_ids = {}
+        for doc_id, doc in documents:
+            key = hashlib.blake2b(doc.page_content.encode("utf-8"), digest_size=16).digest()
+            first_id = first_ids.setdefault(key, doc_id)
+            if first_id == doc_id:
+                yield doc_id, doc
+            else:
+                duplicates.add(doc_id, doc, first_id)
+
+    @staticmethod
+    def _batched(documents: Iterable[Tuple[str, Document]], batch_size: int):
+        """Group (id, Document) pairs into (ids, documents) batches"""
+        ids, docs = [], []
+        for doc_id, doc in documents:
+            ids.append(doc_id)
+            docs.append(doc)
+            if len(ids) >= batch_size:
+                yield ids, docs
+                ids, docs = [], []
+        if ids:
+            yield ids, docs
+
+    def _sync_documents(self, backend: VectorBackend, embedding_slots=None):
+        """Embed only new or changed documents and delete ids that disappeared"""
+        stored_hashes = self._load_content_hashes(backend)
+        hashes = {}
+        counts = {"changed": 0}
+        lexical = self._lexical_builder()
+
+        def changed_documents():
+            documents = self._hashed(self.iter_documents(counts), hashes)
+            for doc_id, doc in lexical.tap(documents) if lexical else documents:
+                if stored_hashes.get(doc_id) != hashes[doc_id]:
+                    counts["changed"] += 1
+                    yield doc_id, doc
+
+        self._add_documents(backend, changed_documents(), embedding_slots, counts)
+
+        removed = [doc_id for doc_id in stored_hashes if doc_id not in hashes]
+        batch_size = self.get_batch_size()
+        with span("ingest.delete"):
+            for start in range(0, len(removed), batch_size):
+                backend.delete(removed[start:start + batch_size])
+        with span("ingest.persist"):
+            backend.persist()
+        self._save_content_hashes(hashes)
+        self._save_lexical_index(lexical)
+
+        self.last_sync_stats = {"changed": counts["changed"], "deleted": len(removed),
+                                "unchanged": len(hashes) - counts["changed"]}
+        print(f"Synced {self.project_name}: {counts['changed']} added/changed, "
+              f"{len(removed)} deleted, {len(hashes) - counts['changed']} unchanged")
+
+    @staticmethod
+    def content_hash(doc: Document) -> str:
+        """Stable hash of a document's page_content and metadata"""
+        payload = json.dumps(
+            {"page_content": doc.page_content, "metadata": doc.metadata},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def content_hash_file(self) -> str:
+        return os.path.join(self.db_location, "content_hashes.json")
+
+    def _load_content_hashes(self, backend: VectorBackend) -> dict:
+        """Load stored id -> content hash map, rebuilding it from the store if missing"""
+        if os.path.exists(self.content_hash_file):
+            with open(self.content_hash_file, 'r') as f:
+                return json.load(f)
+
+        # Stores built before hashes were tracked: hash what the backend holds
+        return {doc_id: self.content_hash(doc) for doc_id, doc in backend.iter_documents()}
+
+    def index_version(self) -> str:
+        """Token that changes whenever the store is rebuilt or synced, stable across restarts"""
+        try:
+            stat = os.stat(self.content_hash_file)
+        except OSError:
+            return "0"
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def _save_content_hashes(self, hashes: dict):
+        with open(self.content_hash_file, 'w') as f:
+            json.dump(hashes, f)
     
     def get_batch_size(self) -> int:
         """Override in subclasses if different batch size needed"""
         return 1000
+
+    def get_csv_chunk_size(self) -> int:
+        """Rows read from data.csv per chunk during ingest"""
+        return max(self.get_batch_size(), 1000)
+
+    def get_embedding_concurrency(self) -> int:
+        """Number of embedding requests kept in flight during ingest; tune to the embedding server"""
+        return 2
@@ -0,0 +1,161 @@
+"""
+Batch query mode: answer a file of (project, question) pairs and write the results as JSON lines
+
+Input is JSONL ({"project": ..., "question": ..., "id": ...}), CSV with project
+and question columns (id optional), or a markdown list such as SEARCH_TOPICS.md,
+where every bold quoted line is a question. A default project covers rows that
+don't name one.
+
+The batch runs as a pipeline. Each project's questions are embedded in bulk into
+the query embedding cache. Retrieval then runs item by item on the calling thread
+and hands each item to a pool of llm_workers generation threads, so retrieval for
+later items overlaps generation for earlier ones while the number of concurrent
+LLM calls stays bounded. Results are appended as each item finishes.
+"""
+import os
+import re
+import csv
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+from metrics import span
+
+
+LABELS_PROJECT = "lcsh_variant_labels"
+MARKDOWN_QUESTION_RE = re.compile(r'^\s*\*\*"(.+?)"\*\*\s*$', re.MULTILINE)
+# Questions embedded per request during the bulk embedding stage
+EMBED_BATCH_SIZE = 64
+
+
+class BatchItem(NamedTuple):
+    index: int
+    project: str
+    question: str
+    id: Optional[str] = None
+
+
+def load_batch(path: str, default_project: str = None) -> List[BatchItem]:
+    """Read (project, question) pairs from a .jsonl, .csv or .md file"""
+    if path.endswith(".md"):
+        with open(path) as f:
+            rows = [{"question": question} for question in MARKDOWN_QUESTION_RE.findall(f.read())]
+    elif path.endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for row in rows:
+        project = row.get("project") or default_project
+        question = (row.get("question") or "").strip()
+        if not project or not question:
+            raise ValueError(f"Row {len(items) + 1} of {path} needs a project and a question: {row}")
+        row_id = row.get("id")
+        items.append(BatchItem(len(items), project, question, None if row_id in (None, "") else str(row_id)))
+    return items
+
+
+class BatchRunner:
+    """Runs a batch through a MultiProjectApp with at most llm_workers concurrent generations"""
+
+    def __init__(self, app, llm_workers: int = 4):
+        self.app = app
+        self.llm_workers = llm_workers
+        self._write_lock = threading.Lock()
+
+    def embed_questions(self, items: List[BatchItem]) -> dict:
+        """Bulk-embed each project's distinct questions; returns seconds per item, the batch cost shared evenly"""
+        manager = self.app.project_manager
+        seconds = {}
+        for project_name in dict.fromkeys(item.project for item in items):
+            project_items = [item for item in items if item.project == project_name]
+            try:
+                # Opening the store first keeps load time out of the embedding timings
+                manager.get_retriever(project_name)
+                embeddings = manager.get_project(project_name).embeddings
+            except Exception as e:
+                # Its items fail individually at retrieval
+                print(f"✗ Failed to load project {project_name}: {e}")
+                continue
+            questions = list(dict.fromkeys(item.question for item in project_items))
+            start = time.perf_counter()
+            if hasattr(embeddings, "embed_queries"):
+                for i in range(0, len(questions), EMBED_BATCH_SIZE):
+                    embeddings.embed_queries(questions[i:i + EMBED_BATCH_SIZE])
+            share = (time.perf_counter() - start) / len(project_items)
+            seconds.update((item.index, share) for item in project_items)
+        return seconds
+
+    def run(self, items: List[BatchItem], output_path: str) -> List[dict]:
+        """Answer every item, appending one JSON line per item to output_path as it completes"""
+        start = time.perf_counter()
+        results = [None] * len(items)
+        open(output_path, "w").close()
+
+        with span("batch.embed"):
+            embed_seconds = self.embed_questions(items)
+        embedded = time.perf_counter()
+        print(f"Embedded {len(items)} questions in {embedded - start:.1f}s")
+
+        def finish(item: BatchItem, result: dict):
+            result["timings"]["total_seconds"] = time.perf_counter() - start
+            results[item.index] = result
+            with self._write_lock:
+                with open(output_path, "a") as f:
+                    f.write(json.dumps(result) + "\n")
+                done = sum(r is not None for r in results)
+            if result["error"]:
+                print(f"✗ [{done}/{len(items)}] {item.project}: {item.question}: {result['error']}")
+            elif done % 10 == 0 or done == len(items):
+                print(f"[{done}/{len(items)}] answered, {time.perf_counter() - start:.1f}s elapsed")
+
+        def generate(item: BatchItem, result: dict, docs: list, embedding, submitted: float):
+            generate_start = time.perf_counter()
+            result["timings"]["queued_seconds"] = generate_start - submitted
+            try:
+                if item.project == LABELS_PROJECT:
+                    result["answer"], result["labels"] = self.app.labels_from_documents(
+                        item.project, item.question, docs, embedding, stream=False)
+                else:
+                    result["answer"] = self.app.answer_from_documents(
+                        item.project, item.question, docs, embedding, stream=False)
+            except Exception as e:
+                result["error"] = str(e)
+            result["timings"]["generate_seconds"] = time.perf_counter() - generate_start
+            finish(item, result)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.llm_workers), thread_name_prefix="batch-llm") as pool:
+            for item in items:
+                result = {"index": item.index, "id": item.id, "project": item.project, "question": item.question,
+                          "answer": None, "cached": False, "error": None,
+                          "timings": {"embed_seconds": embed_seconds.get(item.index, 0.0)}}
+                retrieve_start = time.perf_counter()
+                try:
+                    cached, embedding = self.app.lookup_cached_answer(item.project, item.question, stream=False)
+                    docs = None if cached else self.app.project_manager.retrieve(item.project, item.question)
+                except Exception as e:
+                    result["error"] = str(e)
+                    finish(item, result)
+                    continue
+                result["timings"]["retrieve_seconds"] = time.perf_counter() - retrieve_start
+                if cached:
+                    result.update(answer=cached["answer"], cached=True)
+                    if "labels" in cached["extra"]:
+                        result["labels"] = cached["extra"]["labels"]
+                    finish(item, result)
+                    continue
+                pool.submit(generate, item, result, docs, embedding, time.perf_counter())
+
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for r in results if r["error"])
+        print(f"Answered {len(items) - failed}/{len(items)} questions in {elapsed:.1f}s "
+              f"({len(items) / elapsed:.2f} questions/sec, {self.llm_workers} LLM workers) -> {output_path}")
+        return results
+
+
+def default_output_path(input_path: str) -> str:
+    return os.path.splitext(input_path)[0] + ".results.jsonl"
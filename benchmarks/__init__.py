@@ -0,0 +1,3 @@
+"""
+Benchmarks for ingest and query performance
+"""
@@ -0,0 +1,76 @@
+"""
+Recall-vs-latency report for the IVF ANN index against exact search
+
+Usage:
+    python -m benchmarks.ann_recall --rows 200000 --dims 256      # synthetic clustered vectors
+    python -m benchmarks.ann_recall --project loc_subject_headings  # a built project's index
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex
+
+
+def synthetic_vectors(rows: int, dims: int, clusters: int, seed: int) -> np.ndarray:
+    """Gaussian blobs around random centres, roughly how topical embeddings clump"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dims)).astype(np.float32)
+    labels = rng.integers(0, clusters, rows)
+    return centres[labels] + 0.6 * rng.standard_normal((rows, dims)).astype(np.float32)
+
+
+def perturbed_queries(index: IVFIndex, count: int, seed: int) -> np.ndarray:
+    """Stored vectors with noise added, so queries sit near but not on the data"""
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(index.vectors[np.sort(rng.choice(len(index), count, replace=False))])
+    return rows + 0.05 * rng.standard_normal(rows.shape).astype(np.float32)
+
+
+def synthetic_index(args, directory: str) -> IVFIndex:
+    vectors = synthetic_vectors(args.rows, args.dims, args.clusters, args.seed)
+    batches = ((list(map(str, range(start, start + 10000))), vectors[start:start + 10000])
+               for start in range(0, len(vectors), 10000))
+    return IVFIndex.build(directory, batches, len(vectors), n_partitions=args.partitions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", help="Report on this project's saved IVF index instead of synthetic data")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200, help="Synthetic topic clusters")
+    parser.add_argument("--partitions", type=int, default=0, help="IVF partitions (0 = 4 * sqrt(rows))")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    directory = None
+    if args.project:
+        index = IVFIndex.load(f"./chrome_langchain_db_{args.project}")
+        if index is None:
+            sys.exit(f"No ANN index for {args.project}; set use_ann_index = True and build the project")
+    else:
+        directory = tempfile.mkdtemp(prefix="ann_recall_")
+        index = synthetic_index(args, directory)
+
+    try:
+        queries = perturbed_queries(index, min(args.queries, len(index)), args.seed)
+        print(f"{len(index)} vectors, {index.n_partitions} partitions, {len(queries)} queries, k={args.k}")
+        print(f"{'nprobe':>8} {'recall':>8} {'p50 ms':>9} {'p99 ms':>9}")
+        for row in index.evaluate(queries, args.k, args.nprobe):
+            print(f"{row['nprobe']:>8} {row['recall']:>8.3f} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+    finally:
+        if directory:
+            del index
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare batch mode against sequential query_current_project calls
+
+Both runs answer the same questions against one project with the stub models,
+each starting from an empty embedding cache and a fresh retrieval cache, with
+simulated embedding and LLM latencies standing in for Ollama. Questions come
+from SEARCH_TOPICS.md, numbered to make each one distinct.
+
+Usage:
+    python -m benchmarks.batch_query [--project azdbs] [--questions 200] [--llm-workers 4]
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from batch_query import MARKDOWN_QUESTION_RE
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from main import MultiProjectApp
+from model_backends import use_backend
+from stub_backends import StubEmbeddings
+
+
+def make_app(args, scratch: str, run: str) -> MultiProjectApp:
+    """App whose project stores its vectors under scratch and embeds through a fresh cache"""
+    app = MultiProjectApp(os.path.join(ROOT, "projects"), stream=False, answer_cache_threshold=None)
+    project = app.project_manager.get_project(args.project)
+    project.db_location = os.path.join(scratch, f"db_{args.project}")
+    project.embeddings = CachedEmbeddings(
+        StubEmbeddings(latency=args.embed_latency), model_name=f"stub/{project.embedding_model}",
+        cache=EmbeddingCache(os.path.join(scratch, f"embeddings_{run}.sqlite")))
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.project_manager.get_retriever(args.project)
+    app.current_project = args.project
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", default="azdbs")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--llm-workers", type=int, default=4)
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Simulated seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Simulated LLM prefill seconds")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Simulated LLM seconds per token")
+    args = parser.parse_args()
+
+    use_backend("stub", prefill_latency=args.llm_latency, token_latency=args.token_latency)
+    with open(os.path.join(ROOT, "SEARCH_TOPICS.md")) as f:
+        topics = MARKDOWN_QUESTION_RE.findall(f.read())
+    questions = [f"{topics[i % len(topics)]} ({i // len(topics) + 1})" for i in range(args.questions)]
+
+    scratch = tempfile.mkdtemp(prefix="batch_bench_")
+    try:
+        app = make_app(args, scratch, "sequential")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for question in questions:
+                app.query_current_project(question)
+        sequential = time.perf_counter() - start
+        print(f"sequential  {len(questions)} questions in {sequential:.1f}s")
+
+        app = make_app(args, scratch, "batch")
+        input_path = os.path.join(scratch, "questions.jsonl")
+        with open(input_path, "w") as f:
+            f.writelines(json.dumps({"project": args.project, "question": q}) + "\n" for q in questions)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = app.run_batch(input_path, os.path.join(scratch, "results.jsonl"), llm_workers=args.llm_workers)
+        batch = time.perf_counter() - start
+        failures = sum(1 for r in results if r["error"])
+        print(f"batch       {len(questions)} questions in {batch:.1f}s with {args.llm_workers} LLM workers, "
+              f"{failures} failures ({sequential / batch:.1f}x faster)")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Load test the HTTP query service with concurrent /query requests
+
+Start the service offline first, e.g.:
+    python server.py --backend stub --stub-latency 0.2 --stub-token-latency 0.01
+then:
+    python -m benchmarks.load_test --project azdbs --requests 200 --concurrency 32
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+
+QUESTIONS = [
+    "databases for marine biology",
+    "peer reviewed articles on climate change",
+    "business company profiles",
+    "historical newspapers",
+    "nursing and allied health research",
+]
+
+
+async def post_json(host: str, port: int, path: str, payload: dict) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return {"status": status, "body": json.loads(data) if data else {}}
+
+
+async def run(args):
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(i: int):
+        nonlocal failures
+        async with slots:
+            start = time.perf_counter()
+            result = await post_json(args.host, args.port, "/query",
+                                     {"project": args.project, "question": QUESTIONS[i % len(QUESTIONS)]})
+            latencies.append(time.perf_counter() - start)
+            if result["status"] != 200:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"requests={args.requests} concurrency={args.concurrency} failures={failures}")
+    print(f"wall={elapsed:.2f}s throughput={args.requests / elapsed:.1f} req/s")
+    print(f"latency p50={statistics.median(latencies) * 1000:.0f}ms p99={p99 * 1000:.0f}ms "
+          f"max={latencies[-1] * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--project", default="azdbs")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
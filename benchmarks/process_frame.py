@@ -0,0 +1,71 @@
+"""
+Benchmark process_frame against per-row process_row on each project's data.csv
+
+Usage:
+    python -m benchmarks.process_frame [project ...] [--repeat N] [--csv project=path]
+"""
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from project_manager import ProjectManager
+
+
+DEFAULT_PROJECTS = ["azdbs", "loc_subject_headings", "subject_guides"]
+
+
+def time_call(fn, repeat: int):
+    """Best wall time over repeat runs and the last result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_project(manager: ProjectManager, project_name: str, csv_file: str, repeat: int):
+    project = manager.load_project(project_name)
+    csv_file = csv_file or project.csv_file
+    if not os.path.exists(csv_file):
+        print(f"{project_name:<22} skipped: {csv_file} not found")
+        return None
+
+    df = pd.read_csv(csv_file)
+
+    per_row_time, per_row_docs = time_call(
+        lambda: [project.process_row(row, i) for i, row in df.iterrows()], repeat
+    )
+    frame_time, frame_docs = time_call(lambda: project.process_frame(df), repeat)
+
+    matches = len(per_row_docs) == len(frame_docs) and all(
+        a.page_content == b.page_content and a.metadata == b.metadata and a.id == b.id
+        for a, b in zip(per_row_docs, frame_docs)
+    )
+    speedup = per_row_time / frame_time if frame_time else float("inf")
+    print(f"{project_name:<22} rows={len(df):<8} process_row={per_row_time:.3f}s "
+          f"process_frame={frame_time:.3f}s speedup={speedup:.1f}x identical={matches}")
+    return speedup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("projects", nargs="*", default=DEFAULT_PROJECTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv", action="append", default=[],
+                        help="Override a project's CSV as project=path")
+    parser.add_argument("--projects-dir", default="./projects")
+    args = parser.parse_args()
+
+    csv_overrides = dict(item.split("=", 1) for item in args.csv)
+    manager = ProjectManager(args.projects_dir)
+    for project_name in args.projects:
+        benchmark_project(manager, project_name, csv_overrides.get(project_name), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
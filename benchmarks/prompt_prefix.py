@@ -0,0 +1,108 @@
+"""
+Measure prompt compile cost and LLM prefill savings from the prefix-stable prompt layout
+
+For each project the same questions and retrieved contexts are rendered with the
+"inline" and "prefix" prompt layouts and sent to a stub LLM that charges
+--prefill-token-latency per prompt token not shared with the previous prompt, the
+way Ollama's llama.cpp runner reuses its KV cache. Time to first token is measured
+per query. Documents come from the project's data.csv when present, otherwise from
+synthetic text sized to the project's context budget.
+
+Usage:
+    python -m benchmarks.prompt_prefix [project ...] [--queries 20] [--prefill-token-latency 0.0005]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from langchain_core.documents import Document
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from model_backends import use_backend
+from project_manager import ProjectManager
+from stub_backends import StubLLM
+
+
+DEFAULT_PROJECTS = ["azdbs", "loc_subject_headings", "subject_guides"]
+WORDS = ("library research database history science journal archive policy health education "
+         "economics climate language culture engineering medicine law music art data survey").split()
+
+
+def sample_documents(project, count: int, k: int, rng) -> list:
+    """count lists of k documents: random data.csv rows, or synthetic text if there is no data"""
+    if os.path.exists(project.csv_file):
+        docs = [doc for _, doc in project.iter_documents()]
+        return [[docs[i] for i in rng.choice(len(docs), min(k, len(docs)), replace=False)] for _ in range(count)]
+    words_per_doc = max(40, (project.context_token_budget or 1500) * 3 // (4 * k))
+    return [[Document(page_content=" ".join(rng.choice(WORDS, words_per_doc)), id=str(i * k + j))
+             for j in range(k)] for i in range(count)]
+
+
+def time_compile(project, repeats: int = 200) -> tuple:
+    """Mean seconds for get_prompt_template() and for the cached prompt_template()"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        project.get_prompt_template()
+    uncached = (time.perf_counter() - start) / repeats
+    project.invalidate_prompt_template()
+    project.prompt_template()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        project.prompt_template()
+    return uncached, (time.perf_counter() - start) / repeats
+
+
+def run_layout(project, layout: str, questions, contexts, args) -> dict:
+    project.prompt_layout = layout
+    project.invalidate_prompt_template()
+    llm = StubLLM(prefill_token_latency=args.prefill_token_latency, prefix_cache=True, answer_tokens=1)
+    ttft = []
+    for question, docs in zip(questions, contexts):
+        prompt = project.prompt_template().invoke({"responses": project.build_context(docs).text,
+                                                   "question": question})
+        start = time.perf_counter()
+        next(iter(llm.stream(prompt)))
+        ttft.append(time.perf_counter() - start)
+    # The first query always prefills the whole prompt; report the steady state
+    steady = np.asarray(ttft[1:] or ttft) * 1000
+    return {"p50_ms": float(np.percentile(steady, 50)), "mean_ms": float(steady.mean()), **llm.prefill_stats()}
+
+
+def benchmark_project(manager: ProjectManager, name: str, args):
+    project = manager.load_project(name)
+    rng = np.random.default_rng(args.seed)
+    questions = [" ".join(rng.choice(WORDS, 6)) for _ in range(args.queries)]
+    contexts = sample_documents(project, args.queries, args.k, rng)
+
+    uncached, cached = time_compile(project)
+    print(f"{name:<22} template: get_prompt_template {uncached * 1e6:.0f}us, cached prompt_template "
+          f"{cached * 1e6:.1f}us")
+    results = {layout: run_layout(project, layout, questions, contexts, args) for layout in ("inline", "prefix")}
+    for layout, result in results.items():
+        print(f"{name:<22} {layout:<7} prompt tokens/query {result['prompt_tokens'] // args.queries:<6} "
+              f"cached {result['cached_fraction']:>4.0%}  prefill p50 {result['p50_ms']:.1f}ms "
+              f"mean {result['mean_ms']:.1f}ms")
+    saved = 1 - results["prefix"]["mean_ms"] / results["inline"]["mean_ms"]
+    print(f"{name:<22} prefix layout saves {saved:.0%} of prefill time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("projects", nargs="*", default=DEFAULT_PROJECTS)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("-k", type=int, default=5, help="Documents per query")
+    parser.add_argument("--prefill-token-latency", type=float, default=0.0005,
+                        help="Simulated prefill seconds per uncached prompt token")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    use_backend("stub")
+    manager = ProjectManager(os.path.join(ROOT, "projects"))
+    for name in args.projects:
+        benchmark_project(manager, name, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Measure MMR re-ranking latency and result diversity
+
+Synthetic store shaped like subject guides: --guides groups of --sections rows
+each, every row its guide's centre vector plus noise, so plain top-k tends to
+return several sections of one guide. Queries sit near a random guide. For each
+fetch_k the plain top-k is compared with the re-ranked one on distinct guides
+per result list, and the re-ranking time (vector fetch from a flat backend plus
+MMR) is reported.
+
+Usage:
+    python -m benchmarks.rerank [--guides 2000] [--sections 12] [--dimensions 1024]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from langchain_core.documents import Document
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from reranker import mmr
+from vector_backends import FlatVectorBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guides", type=int, default=2000)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--noise", type=float, default=0.6, help="Section noise relative to the guide centre")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--lambda-mult", type=float, default=0.7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((args.guides, args.dimensions)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    guide_of = np.repeat(np.arange(args.guides), args.sections)
+    noise = rng.standard_normal((len(guide_of), args.dimensions)).astype(np.float32) / np.sqrt(args.dimensions)
+    vectors = centres[guide_of] + args.noise * noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    scratch = tempfile.mkdtemp(prefix="rerank_bench_")
+    try:
+        backend = FlatVectorBackend("rerank", scratch, None)
+        ids = [str(i) for i in range(len(vectors))]
+        backend.upsert(ids, [Document(page_content="", metadata={"subject_id": str(g)}, id=i)
+                             for i, g in zip(ids, guide_of)], vectors)
+        backend.persist()
+
+        targets = rng.integers(0, args.guides, args.queries)
+        queries = centres[targets] + args.noise * rng.standard_normal(
+            (args.queries, args.dimensions)).astype(np.float32) / np.sqrt(args.dimensions)
+        print(f"{len(vectors)} rows in {args.guides} guides, {args.dimensions} dimensions, k={args.k}")
+        for fetch_k in args.fetch_k:
+            plain_groups, reranked_groups, latencies = [], [], []
+            for query in queries:
+                candidates = backend.similarity_search_by_vector(query, fetch_k)
+                plain_groups.append(len({doc.metadata["subject_id"] for doc in candidates[:args.k]}))
+                start = time.perf_counter()
+                candidate_vectors = backend.get_vectors([doc.id for doc in candidates])
+                groups = [doc.metadata["subject_id"] for doc in candidates]
+                order = mmr(query, candidate_vectors, args.k, args.lambda_mult, groups)
+                latencies.append(time.perf_counter() - start)
+                reranked_groups.append(len({groups[i] for i in order}))
+            ms = np.asarray(latencies) * 1000
+            print(f"fetch_k={fetch_k:<4} distinct guides in top {args.k}: plain {np.mean(plain_groups):.2f}, "
+                  f"re-ranked {np.mean(reranked_groups):.2f}; re-rank p50 {np.percentile(ms, 50):.2f}ms "
+                  f"p99 {np.percentile(ms, 99):.2f}ms")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark time to first prompt with many registered projects
+
+Each run starts a fresh interpreter, builds MultiProjectApp, runs initialize()
+against a temporary projects directory holding copies of project_tpl, and reports
+wall time plus which heavy libraries were imported before the prompt would appear.
+
+Usage:
+    python -m benchmarks.startup [--projects N] [--runs N]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "langchain_core", "langchain_ollama", "langchain_chroma", "chromadb"]
+
+CHILD_SCRIPT = """
+import sys, time, json, io, contextlib
+start = time.perf_counter()
+sys.path.insert(0, {repo_root!r})
+from main import MultiProjectApp
+with contextlib.redirect_stdout(io.StringIO()):
+    app = MultiProjectApp({projects_dir!r})
+    app.initialize()
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "projects": len(app.project_manager.list_projects()),
+    "heavy_imports": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def make_projects(projects_dir: str, count: int):
+    template_dir = os.path.join(REPO_ROOT, "project_tpl")
+    for i in range(count):
+        shutil.copytree(template_dir, os.path.join(projects_dir, f"project_{i:03d}"))
+
+
+def run_once(projects_dir: str) -> dict:
+    script = CHILD_SCRIPT.format(repo_root=REPO_ROOT, projects_dir=projects_dir, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=projects_dir
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        projects_dir = os.path.join(tmp, "projects")
+        os.makedirs(projects_dir)
+        make_projects(projects_dir, args.projects)
+        results = [run_once(projects_dir) for _ in range(args.runs)]
+
+    in_process = [r["seconds"] for r in results]
+    wall = [r["process_seconds"] for r in results]
+    print(f"projects={results[0]['projects']} runs={args.runs}")
+    print(f"initialize (in process): median={statistics.median(in_process):.3f}s max={max(in_process):.3f}s")
+    print(f"time to first prompt (incl. interpreter): median={statistics.median(wall):.3f}s max={max(wall):.3f}s")
+    print(f"heavy modules imported at startup: {', '.join(results[0]['heavy_imports']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
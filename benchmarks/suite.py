@@ -0,0 +1,240 @@
+"""
+Offline end-to-end benchmark suite using the deterministic stub model backends
+
+Stages, per dataset:
+    csv_load        pandas read of the whole CSV
+    process_row     per-row document build (on up to --row-sample rows)
+    process_frame   chunked document build through iter_documents()
+    ingest          embedding batches plus store insertion through the ingest pipeline
+    retrieval       retriever.invoke latency over sampled questions
+    end_to_end      MultiProjectApp.query_current_project latency with the stub LLM
+
+Datasets are projects/azdbs/data.csv and the two root CSVs, and --scale adds
+synthetic copies of each grown to the given row counts. Every measurement is
+printed and, with --output, appended as one JSON line tagged with the git
+commit so runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.suite [--dataset azdbs ...] [--scale 100000 1000000] [--output results.jsonl]
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from base_project import BaseProject
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from main import MultiProjectApp
+from model_backends import use_backend
+from project_manager import ProjectManager
+from stub_backends import StubEmbeddings
+
+
+class RestaurantReviewsProject(BaseProject):
+    """realistic_restaurant_reviews.csv: review text with title, date and rating metadata"""
+
+    def process_row(self, row: pd.Series, index: int) -> Document:
+        page_content = f"{row['Title']} {row['Review']}"
+        metadata = {"rating": str(row['Rating']), "date": str(row['Date'])}
+        return Document(page_content=page_content, metadata=metadata, id=str(index))
+
+    def get_prompt_template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_template(
+            "Here are some relevant reviews: {responses}\n\nHere is the question to answer: {question}")
+
+
+class UXMaturityProject(BaseProject):
+    """uxmaturity2018_dataset_redacted.csv, built the same way as vector.create_vector_store"""
+
+    def process_row(self, row: pd.Series, index: int) -> Document:
+        page_content = f"Institution Type: {row['classification']} "
+        if isinstance(row['reasons_for_stage_number'], str):
+            page_content += f"Comments: {row['reasons_for_stage_number']}"
+        metadata = {"stage": str(row["stage"]), "stage_bin": str(row["stage_bin"]),
+                    "total_methods": str(row["total_methods"])}
+        return Document(page_content=page_content, metadata=metadata, id=str(index))
+
+    def get_prompt_template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_template(
+            "Survey responses: {responses}\n\nQuestion: {question}")
+
+
+# name -> (csv path, project factory, column made unique in synthetic scale-ups)
+DATASETS = {
+    "azdbs": (os.path.join(ROOT, "projects", "azdbs", "data.csv"), None, "title"),
+    "restaurant_reviews": (os.path.join(ROOT, "realistic_restaurant_reviews.csv"), RestaurantReviewsProject, "Review"),
+    "ux_maturity": (os.path.join(ROOT, "uxmaturity2018_dataset_redacted.csv"), UXMaturityProject,
+                    "reasons_for_stage_number"),
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentiles(seconds) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+            "mean_ms": float(ms.mean())}
+
+
+def scaled_csv(csv_file: str, unique_column: str, rows: int, path: str) -> str:
+    """Repeat a CSV's rows up to rows, suffixing one column so every document text is distinct"""
+    df = pd.read_csv(csv_file)
+    scaled = df.iloc[np.arange(rows) % len(df)].reset_index(drop=True)
+    copy = pd.Series(np.arange(rows) // len(df), dtype=str)
+    scaled[unique_column] = scaled[unique_column].astype(str) + " #" + copy
+    scaled.to_csv(path, index=False)
+    return path
+
+
+class Suite:
+    def __init__(self, args, scratch: str):
+        self.args = args
+        self.scratch = scratch
+        self.commit = git_commit()
+        self.manager = ProjectManager(os.path.join(ROOT, "projects"))
+
+    def record(self, dataset: str, rows: int, stage: str, **metrics):
+        result = {"commit": self.commit, "timestamp": time.time(), "dataset": dataset, "rows": rows,
+                  "stage": stage, **metrics}
+        shown = " ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+        print(f"{dataset:<28} rows={rows:<9} {stage:<14} {shown}")
+        if self.args.output:
+            with open(self.args.output, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+    def make_project(self, name: str, factory, csv_file: str) -> BaseProject:
+        """Project instance reading csv_file and storing everything under the scratch directory"""
+        project = self.manager.load_project("azdbs") if factory is None else factory(name, self.scratch)
+        project.project_name = name
+        project.csv_file = csv_file
+        project.db_location = os.path.join(self.scratch, f"db_{name}")
+        if self.args.vector_backend:
+            project.vector_backend = self.args.vector_backend
+        # Fresh embedding cache per dataset, so ingest measures real embedding calls
+        cache = EmbeddingCache(os.path.join(self.scratch, f"embeddings_{name}.sqlite"))
+        project.embeddings = CachedEmbeddings(
+            StubEmbeddings(self.args.dimensions, self.args.embed_latency, self.args.embed_per_text_latency),
+            model_name=f"stub/{project.embedding_model}", cache=cache)
+        return project
+
+    def run_dataset(self, name: str, factory, csv_file: str):
+        project = self.make_project(name, factory, csv_file)
+
+        start = time.perf_counter()
+        df = pd.read_csv(csv_file)
+        elapsed = time.perf_counter() - start
+        rows = len(df)
+        self.record(name, rows, "csv_load", seconds=elapsed, rows_per_sec=rows / elapsed)
+
+        sample = df.head(self.args.row_sample)
+        start = time.perf_counter()
+        for i, row in sample.iterrows():
+            project.process_row(row, i)
+        elapsed = time.perf_counter() - start
+        self.record(name, rows, "process_row", sample_rows=len(sample), seconds=elapsed,
+                    rows_per_sec=len(sample) / elapsed)
+        del df, sample
+
+        start = time.perf_counter()
+        texts = [doc.page_content for _, doc in project.iter_documents()]
+        elapsed = time.perf_counter() - start
+        self.record(name, rows, "process_frame", seconds=elapsed, rows_per_sec=rows / elapsed)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.manager.projects[name] = project
+            self.manager.create_vector_store(name)
+        elapsed = time.perf_counter() - start
+        stats = project.last_ingest_stats
+        self.record(name, rows, "ingest", backend=project.vector_backend, seconds=elapsed,
+                    rows_per_sec=rows / elapsed, embed_seconds=stats.embed_seconds,
+                    write_seconds=stats.write_seconds, batches=stats.batches)
+
+        rng = np.random.default_rng(self.args.seed)
+        questions = [texts[i] for i in rng.choice(len(texts), min(self.args.queries, len(texts)), replace=False)]
+        del texts
+        retriever = self.manager.get_retriever(name)
+        latencies = []
+        for question in questions:
+            start = time.perf_counter()
+            retriever.invoke(question)
+            latencies.append(time.perf_counter() - start)
+        self.record(name, rows, "retrieval", queries=len(questions), **percentiles(latencies))
+
+        app = MultiProjectApp(os.path.join(ROOT, "projects"), stream=False, answer_cache_threshold=None)
+        app.project_manager = self.manager
+        app.current_project = name
+        self.manager.retrieval_cache.clear()
+        latencies, failures = [], 0
+        for question in questions[:self.args.end_to_end_queries]:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if app.query_current_project(question) is None:
+                    failures += 1
+            latencies.append(time.perf_counter() - start)
+        ttft = [m["time_to_first_token"] for m in app.query_metrics]
+        self.record(name, rows, "end_to_end", queries=len(latencies), failures=failures,
+                    **percentiles(latencies), ttft_p50_ms=float(np.percentile(ttft, 50) * 1000) if ttft else 0.0)
+
+    def run(self):
+        for name in self.args.dataset:
+            csv_file, factory, unique_column = DATASETS[name]
+            if not os.path.exists(csv_file):
+                print(f"{name:<28} skipped: {csv_file} not found")
+                continue
+            self.run_dataset(name, factory, csv_file)
+            for rows in self.args.scale:
+                scaled_name = f"{name}_x{rows}"
+                path = scaled_csv(csv_file, unique_column, rows, os.path.join(self.scratch, f"{scaled_name}.csv"))
+                self.run_dataset(scaled_name, factory, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--scale", type=int, nargs="*", default=[],
+                        help="Also run synthetic copies of each dataset with these row counts")
+    parser.add_argument("--vector-backend", choices=["chroma", "flat"], default=None,
+                        help="Override each project's vector backend")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries per dataset")
+    parser.add_argument("--end-to-end-queries", type=int, default=50)
+    parser.add_argument("--row-sample", type=int, default=20000, help="Rows timed through process_row")
+    parser.add_argument("--dimensions", type=int, default=256, help="Stub embedding dimensions")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Simulated seconds per embedding call")
+    parser.add_argument("--embed-per-text-latency", type=float, default=0.0,
+                        help="Simulated extra seconds per embedded text")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated LLM prefill seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Simulated LLM seconds per token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Append JSON lines results to this file")
+    args = parser.parse_args()
+
+    use_backend("stub", dimensions=args.dimensions, prefill_latency=args.llm_latency,
+                token_latency=args.token_latency)
+    scratch = tempfile.mkdtemp(prefix="rag_bench_")
+    try:
+        Suite(args, scratch).run()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
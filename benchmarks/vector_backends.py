@@ -0,0 +1,155 @@
+"""
+Compare vector backends on load time, memory and query latency
+
+Each project is built once per backend into a scratch directory (stub
+embeddings by default, so no Ollama is needed), then every backend is opened
+in a fresh interpreter so import and client start-up costs are measured the
+way a real process pays them.
+
+Usage:
+    python -m benchmarks.vector_backends [project ...] [--queries 200] [--model-backend ollama]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+DEFAULT_PROJECTS = ["azdbs", "loc_subject_headings", "subject_guides"]
+BACKENDS = ["chroma", "flat"]
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux), falling back to peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def child(backend_name: str, directory: str, collection: str, queries_path: str, k: int):
+    """Open one backend and time queries; runs in its own interpreter
+
+    load covers opening the store and the first query, which is when Chroma
+    imports its client and starts SQLite.
+    """
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    from vector_backends import open_backend
+    import_seconds = time.perf_counter() - start
+    backend = open_backend(backend_name, collection, directory, None)
+    backend.similarity_search_by_vector(np.load(queries_path)[0], k)
+    load_seconds = time.perf_counter() - start - import_seconds
+    rss_loaded = rss_bytes()
+
+    latencies, results = [], []
+    for vector in np.load(queries_path):
+        query_start = time.perf_counter()
+        docs = backend.similarity_search_by_vector(vector, k)
+        latencies.append(time.perf_counter() - query_start)
+        results.append([doc.id for doc in docs])
+    latencies = np.asarray(latencies) * 1000
+    print(json.dumps({
+        "backend": backend_name,
+        "rows": backend.count(),
+        "import_seconds": import_seconds,
+        "load_seconds": load_seconds,
+        "rss_mb": (rss_loaded - rss_before) / 2 ** 20,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "results": results,
+    }))
+
+
+def build(project_name: str, backend_name: str, scratch: str):
+    from project_manager import ProjectManager
+    manager = ProjectManager(os.path.join(ROOT, "projects"))
+    project = manager.load_project(project_name)
+    if not os.path.exists(project.csv_file):
+        return None
+    project.vector_backend = backend_name
+    project.use_ann_index = False
+    project.db_location = os.path.join(scratch, f"{project_name}_{backend_name}")
+    start = time.perf_counter()
+    project.create_vector_store()
+    return project, time.perf_counter() - start
+
+
+def benchmark_project(project_name: str, args, scratch: str):
+    runs = []
+    for backend_name in BACKENDS:
+        built = build(project_name, backend_name, scratch)
+        if built is None:
+            print(f"{project_name:<22} skipped: data.csv not found")
+            return
+        project, build_seconds = built
+        queries_path = os.path.join(scratch, f"{project_name}_queries.npy")
+        if not os.path.exists(queries_path):
+            rng = np.random.default_rng(0)
+            texts = [doc.page_content for _, doc in project.iter_documents()]
+            sample = [texts[i] for i in rng.choice(len(texts), min(args.queries, len(texts)), replace=False)]
+            np.save(queries_path, np.asarray(project.embeddings.embed_documents(sample), dtype=np.float32))
+
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.vector_backends", "--child", backend_name, project.db_location,
+             project_name, queries_path, "-k", str(args.k)],
+            cwd=ROOT, stdout=subprocess.PIPE, text=True, check=True
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run["build_seconds"] = build_seconds
+        runs.append(run)
+
+    reference = runs[-1]["results"]
+    for run in runs:
+        overlap = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(run.pop("results"), reference)])
+        print(f"{project_name:<22} {run['backend']:<7} rows={run['rows']:<8} build={run['build_seconds']:.2f}s "
+              f"import={run['import_seconds'] * 1000:.0f}ms load={run['load_seconds'] * 1000:.0f}ms rss=+{run['rss_mb']:.0f}MB "
+              f"query p50={run['p50_ms']:.2f}ms p99={run['p99_ms']:.2f}ms overlap={overlap:.2f}")
+        if args.jsonl:
+            with open(args.jsonl, "a") as f:
+                f.write(json.dumps({"project": project_name, **run, "overlap_with_flat": float(overlap)}) + "\n")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--child", dest="backend")
+        parser.add_argument("directory")
+        parser.add_argument("collection")
+        parser.add_argument("queries")
+        parser.add_argument("-k", type=int, default=5)
+        args = parser.parse_args()
+        child(args.backend, args.directory, args.collection, args.queries, args.k)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("projects", nargs="*", default=DEFAULT_PROJECTS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--model-backend", choices=["ollama", "stub"], default="stub",
+                        help="Embedding backend used to build the stores")
+    parser.add_argument("--jsonl", help="Also append one JSON result per project and backend to this file")
+    args = parser.parse_args()
+
+    from model_backends import use_backend
+    use_backend(args.model_backend)
+    scratch = tempfile.mkdtemp(prefix="vector_backends_")
+    try:
+        for project_name in args.projects:
+            benchmark_project(project_name, args, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Token-budgeted assembly of retrieved documents into prompt context
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from langchain_core.documents import Document
+
+
+PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about four characters per token for English text with Llama-style tokenizers"""
+    return (len(text) + 3) // 4
+
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens: int
+    # Tokens the same documents would take with no dedup or budget
+    raw_tokens: int
+    documents: int
+    dropped: int
+    truncated: bool
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+
+class ContextBuilder:
+    """Packs ranked documents into at most token_budget tokens
+
+    Documents are taken in retrieval order, which is best match first. A document
+    identical to an earlier one is dropped. Paragraphs already emitted by an
+    earlier document of the same group_key value, such as the guide header
+    repeated on every section of one guide, are dropped too, and so are documents
+    left with nothing new; without group_key every document is its own group, so
+    headers naming a different guide's librarian are never lost. Each document is
+    prefixed with a single "key: value; ..." line holding only
+    metadata_fields. The first document that does not fit is cut at a word
+    boundary if at least min_truncated_tokens fit; everything after it is dropped.
+    A budget of 0 means unlimited.
+    """
+
+    def __init__(self, token_budget: int = 0, metadata_fields: Iterable[str] = (),
+                 group_key: Optional[str] = None, min_truncated_tokens: int = 32):
+        self.token_budget = token_budget
+        self.metadata_fields = list(metadata_fields)
+        self.group_key = group_key
+        self.min_truncated_tokens = min_truncated_tokens
+
+    def metadata_line(self, doc: Document) -> str:
+        values = []
+        for field in self.metadata_fields:
+            value = doc.metadata.get(field)
+            if value not in (None, ""):
+                values.append(f"{field}: {WHITESPACE_RE.sub(' ', str(value)).strip()}")
+        return "; ".join(values)
+
+    def block(self, doc: Document, content: str) -> str:
+        header = self.metadata_line(doc)
+        return f"{header}\n{content}" if header and content else header or content
+
+    def build(self, documents: List[Document]) -> PackedContext:
+        raw_tokens = estimate_tokens("\n\n".join(self.block(doc, doc.page_content) for doc in documents))
+
+        seen_documents = set()
+        # Normalized paragraphs already emitted, by group_key value
+        seen: Dict[str, set] = {}
+        blocks: List[str] = []
+        used = 0
+        truncated = False
+        for doc in documents:
+            document_key = self._normalize(self.block(doc, doc.page_content))
+            if document_key in seen_documents:
+                continue
+            seen_documents.add(document_key)
+
+            group = doc.metadata.get(self.group_key) if self.group_key else None
+            seen_in_group = seen.setdefault(group, set()) if group is not None else set()
+            paragraphs = []
+            for paragraph in PARAGRAPH_SPLIT_RE.split(doc.page_content):
+                key = self._normalize(paragraph)
+                if key and key not in seen_in_group:
+                    seen_in_group.add(key)
+                    paragraphs.append(paragraph.strip())
+            if not paragraphs:
+                continue
+
+            block = self.block(doc, "\n\n".join(paragraphs))
+            # Blocks are joined with a blank line, which costs about one token
+            cost = estimate_tokens(block) + (1 if blocks else 0)
+            if self.token_budget and used + cost > self.token_budget:
+                remaining = self.token_budget - used - (1 if blocks else 0)
+                if remaining >= self.min_truncated_tokens:
+                    blocks.append(self._truncate(block, remaining))
+                    truncated = True
+                break
+            blocks.append(block)
+            used += cost
+
+        text = "\n\n".join(blocks)
+        return PackedContext(text, estimate_tokens(text), raw_tokens, len(blocks),
+                             len(documents) - len(blocks), truncated)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return WHITESPACE_RE.sub(" ", text).strip().lower()
+
+    @staticmethod
+    def _truncate(text: str, tokens: int) -> str:
+        """Cut text to about tokens tokens at a word boundary, marking the cut with an ellipsis"""
+        limit = max(0, tokens * 4 - 3)
+        cut = text[:limit]
+        if " " in cut:
+            cut = cut[:cut.rindex(" ")]
+        return cut.rstrip() + "..."
@@ -0,0 +1,194 @@
+"""
+Pipelined bulk ingest: concurrent embedding requests feeding a single store writer
+"""
+import time
+import queue
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from metrics import observe
+
+
+_DONE = object()
+
+
+class IngestStats:
+    """Row counts and timing for one ingest run"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.rows = 0
+        self.batches = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        # Rows dropped before document building, and documents that reused another's embedding
+        self.skipped_rows = 0
+        self.duplicates = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        summary = (f"{self.rows} rows in {self.elapsed:.1f}s ({self.rows_per_sec:.1f} rows/sec, "
+                   f"concurrency {self.concurrency}, embed {self.embed_seconds:.1f}s, "
+                   f"write {self.write_seconds:.1f}s)")
+        if self.skipped_rows or self.duplicates:
+            summary += (f"; {self.skipped_rows} rows skipped in preprocessing, "
+                        f"{self.duplicates} duplicate texts reused an embedding")
+        return summary
+
+
+class DuplicateWriter:
+    """Writes documents whose text repeats an earlier one, with the earlier document's stored vector
+
+    Wraps the store's upsert as the pipeline's writer. Repeats passed to add()
+    wait only until the batch holding their first occurrence has been written,
+    then go out batch_size at a time, so they are not held until the whole
+    file is embedded. finish() writes the rest once the pipeline is done.
+    """
+
+    def __init__(self, upsert: Callable[[List[str], List[Document], List[List[float]]], None],
+                 get_vectors: Callable[[List[str]], list], batch_size: int):
+        self.upsert = upsert
+        self.get_vectors = get_vectors
+        self.batch_size = batch_size
+        self.rows = 0
+        self._written = set()
+        # (id, document, first id) repeats whose first id is not written yet, and those ready to write
+        self._waiting: List[Tuple[str, Document, str]] = []
+        self._ready: List[Tuple[str, Document, str]] = []
+        self._lock = threading.Lock()
+
+    def add(self, doc_id: str, doc: Document, first_id: str):
+        with self._lock:
+            (self._ready if first_id in self._written else self._waiting).append((doc_id, doc, first_id))
+
+    def write(self, ids: List[str], documents: List[Document], vectors: List[List[float]]):
+        self.upsert(ids, documents, vectors)
+        with self._lock:
+            self._written.update(ids)
+            if self._waiting:
+                waiting, self._waiting = self._waiting, []
+                for item in waiting:
+                    (self._ready if item[2] in self._written else self._waiting).append(item)
+            if len(self._ready) < self.batch_size:
+                return
+            ready, self._ready = self._ready, []
+        self._flush(ready)
+
+    def finish(self):
+        """Write every remaining repeat; call after all embedded batches have been written"""
+        with self._lock:
+            remaining, self._ready, self._waiting = self._ready + self._waiting, [], []
+        self._flush(remaining)
+
+    def _flush(self, duplicates: List[Tuple[str, Document, str]]):
+        for start in range(0, len(duplicates), self.batch_size):
+            batch = duplicates[start:start + self.batch_size]
+            vectors = self.get_vectors([first_id for _, _, first_id in batch])
+            missing = [doc_id for (doc_id, _, _), vector in zip(batch, vectors) if vector is None]
+            if missing:
+                # Skipping them would leave their content hashes saved, so no later sync would add them
+                raise RuntimeError(f"No stored vector for the first copy of {len(missing)} repeated "
+                                   f"documents, e.g. {missing[0]}")
+            self.upsert([doc_id for doc_id, _, _ in batch], [doc for _, doc, _ in batch], vectors)
+            self.rows += len(batch)
+
+
+class IngestPipeline:
+    """Embed batches on a pool of worker threads while one writer thread commits to the store
+
+    Both hand-off queues are bounded, so a slow embedding server or a slow store
+    applies backpressure to the producer instead of buffering the whole dataset.
+    """
+
+    def __init__(self, embeddings: Embeddings,
+                 writer: Callable[[List[str], List[Document], List[List[float]]], None],
+                 concurrency: int = 2, queue_size: int = 0,
+                 embedding_slots: Optional[threading.Semaphore] = None):
+        self.embeddings = embeddings
+        self.writer = writer
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size or self.concurrency * 2
+        # Optional semaphore shared across pipelines to cap total embedding requests
+        self.embedding_slots = embedding_slots
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.embedding_slots is None:
+            return self.embeddings.embed_documents(texts)
+        with self.embedding_slots:
+            return self.embeddings.embed_documents(texts)
+
+    def run(self, batches: Iterable[Tuple[List[str], List[Document]]]) -> IngestStats:
+        """Embed and write every (ids, documents) batch, returning throughput stats"""
+        stats = IngestStats(self.concurrency)
+        work_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        stats_lock = threading.Lock()
+
+        def embed_worker():
+            while True:
+                item = work_queue.get()
+                if item is _DONE:
+                    break
+                if errors:
+                    continue
+                ids, documents = item
+                try:
+                    start = time.perf_counter()
+                    vectors = self._embed([doc.page_content for doc in documents])
+                    elapsed = time.perf_counter() - start
+                    observe("ingest.embed_batch", elapsed)
+                    with stats_lock:
+                        stats.embed_seconds += elapsed
+                    write_queue.put((ids, documents, vectors))
+                except Exception as e:
+                    errors.append(e)
+
+        def write_worker():
+            while True:
+                item = write_queue.get()
+                if item is _DONE:
+                    break
+                if errors:
+                    continue
+                ids, documents, vectors = item
+                try:
+                    start = time.perf_counter()
+                    self.writer(ids, documents, vectors)
+                    elapsed = time.perf_counter() - start
+                    observe("ingest.write_batch", elapsed)
+                    stats.write_seconds += elapsed
+                    stats.rows += len(ids)
+                    stats.batches += 1
+                except Exception as e:
+                    errors.append(e)
+
+        embedders = [threading.Thread(target=embed_worker, daemon=True) for _ in range(self.concurrency)]
+        writer = threading.Thread(target=write_worker, daemon=True)
+        for thread in embedders:
+            thread.start()
+        writer.start()
+
+        try:
+            for batch in batches:
+                if errors:
+                    break
+                work_queue.put(batch)
+        finally:
+            for _ in embedders:
+                work_queue.put(_DONE)
+            for thread in embedders:
+                thread.join()
+            write_queue.put(_DONE)
+            writer.join()
+
+        stats.elapsed = time.perf_counter() - stats.started
+        if errors:
+            raise errors[0]
+        return stats
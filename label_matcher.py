@@ -0,0 +1,116 @@
+"""
+Aho-Corasick multi-pattern matcher for finding candidate labels in LLM output
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+
+class LabelMatch(NamedTuple):
+    label: str
+    start: int
+    end: int
+
+
+def _fold(ch: str) -> str:
+    """Lowercase a single character without changing its length, so positions stay valid"""
+    lowered = ch.lower()
+    return lowered if len(lowered) == 1 else ch
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class LabelMatcher:
+    """Finds every occurrence of a fixed set of labels in one pass over the text
+
+    Matching is case-insensitive and only accepts occurrences bounded by
+    non-word characters (or the ends of the text) on both sides.
+    """
+
+    def __init__(self, labels: Iterable[str]):
+        self.labels: List[str] = []
+        # Trie as parallel lists indexed by state; state 0 is the root
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for label in dict.fromkeys(label for label in labels if label and label.strip()):
+            self._add(label)
+        self._link()
+
+    def _add(self, label: str):
+        state = 0
+        for ch in label:
+            ch = _fold(ch)
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state].append(len(self.labels))
+        self.labels.append(label)
+
+    def _link(self):
+        """Breadth-first failure links; each state's output also gets its fail state's output"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+                queue.append(child)
+
+    def find_all(self, text: str) -> List[LabelMatch]:
+        """All word-bounded matches, including overlapping ones, ordered by start position"""
+        matches = []
+        state = 0
+        goto, fail, output, labels = self._goto, self._fail, self._output, self.labels
+        for i, ch in enumerate(text):
+            ch = _fold(ch)
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+            end = i + 1
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            for index in output[state]:
+                start = end - len(labels[index])
+                if start == 0 or not _is_word_char(text[start - 1]):
+                    matches.append(LabelMatch(labels[index], start, end))
+        matches.sort(key=lambda match: (match.start, -match.end))
+        return matches
+
+    def labels_in(self, text: str) -> List[str]:
+        """Distinct labels found in the text, in the order they were given to the matcher"""
+        found = {match.label for match in self.find_all(text)}
+        return [label for label in self.labels if label in found]
+
+    def highlight(self, text: str, before: str = "\033[1m", after: str = "\033[0m") -> str:
+        """Wrap the leftmost-longest non-overlapping matches in before/after markers"""
+        pieces, cursor = [], 0
+        for match in self.find_all(text):
+            if match.start < cursor:
+                continue
+            pieces.append(text[cursor:match.start])
+            pieces.append(before + text[match.start:match.end] + after)
+            cursor = match.end
+        pieces.append(text[cursor:])
+        return "".join(pieces)
+
+
+@lru_cache(maxsize=256)
+def _cached_matcher(labels: Tuple[str, ...]) -> LabelMatcher:
+    return LabelMatcher(labels)
+
+
+def matcher_for(labels: Iterable[str]) -> LabelMatcher:
+    """Shared matcher for a candidate set, so repeated sets reuse the built automaton"""
+    return _cached_matcher(tuple(labels))
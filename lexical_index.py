@@ -0,0 +1,200 @@
+"""
+BM25 inverted index and hybrid lexical + vector retrieval
+"""
+import os
+import re
+import json
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def normalize_label(text: str) -> str:
+    """Key used for exact title/heading lookups"""
+    return " ".join(tokenize(text))
+
+
+class LexicalIndexBuilder:
+    """Accumulates term counts for documents as they stream past during ingest
+
+    Terms get ids as they are first seen and each document's postings are
+    appended as (term id, document index, tf) to flat typed arrays, so memory
+    grows by a few bytes per posting rather than a Counter per document.
+    """
+
+    def __init__(self, exact_match_fields: Iterable[str] = ()):
+        self.exact_match_fields = list(exact_match_fields)
+        self.doc_ids: List[str] = []
+        self.vocab: Dict[str, int] = {}
+        self.posting_terms = array("i")
+        self.posting_docs = array("i")
+        self.posting_tfs = array("f")
+        self.doc_lengths = array("f")
+        self.exact: Dict[str, List[str]] = {}
+
+    def add(self, doc_id: str, doc: Document):
+        doc_index = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        terms = Counter(tokenize(doc.page_content))
+        self.posting_terms.extend(self.vocab.setdefault(term, len(self.vocab)) for term in terms)
+        self.posting_docs.extend([doc_index] * len(terms))
+        self.posting_tfs.extend(terms.values())
+        self.doc_lengths.append(sum(terms.values()))
+        for field in self.exact_match_fields:
+            value = doc.page_content if field == "page_content" else doc.metadata.get(field)
+            if value:
+                self.exact.setdefault(normalize_label(str(value)), []).append(doc_id)
+
+    def tap(self, documents: Iterable[Tuple[str, Document]]):
+        """Pass (id, Document) pairs through while indexing them"""
+        for doc_id, doc in documents:
+            self.add(doc_id, doc)
+            yield doc_id, doc
+
+    def build(self) -> "BM25Index":
+        terms = np.frombuffer(self.posting_terms, dtype=np.int32)
+        # Compressed sparse rows: postings for term t are docs[indptr[t]:indptr[t + 1]].
+        # A stable sort keeps each term's postings in document order.
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=indptr[1:])
+        docs = np.frombuffer(self.posting_docs, dtype=np.int32)[order]
+        tfs = np.frombuffer(self.posting_tfs, dtype=np.float32)[order]
+        doc_lengths = np.array(self.doc_lengths, dtype=np.float32)
+        return BM25Index(list(self.vocab), indptr, docs, tfs, doc_lengths, self.doc_ids, self.exact)
+
+
+class BM25Index:
+    """Okapi BM25 over an immutable CSR inverted index, with an exact-label lookup table"""
+
+    DATA_FILE = "lexical_index.npz"
+    META_FILE = "lexical_index.json"
+
+    def __init__(self, terms: List[str], indptr: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, doc_ids: List[str], exact: Dict[str, List[str]],
+                 k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.doc_ids = doc_ids
+        self.exact = exact
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        document_frequency = np.diff(indptr).astype(np.float32)
+        n = len(doc_ids)
+        self.idf = np.log(1 + (n - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k (id, score) pairs for a free-text query"""
+        rows = [self.vocab[term] for term in set(tokenize(query)) if term in self.vocab]
+        if not rows or not len(self.doc_ids):
+            return []
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_length or 1.0))
+        for row in rows:
+            start, end = self.indptr[row], self.indptr[row + 1]
+            docs, tfs = self.docs[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[row] * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+    def exact_lookup(self, query: str) -> List[str]:
+        """Ids whose exact-match field equals the query, ignoring case and punctuation"""
+        return self.exact.get(normalize_label(query), [])
+
+    def save(self, directory: str):
+        np.savez(os.path.join(directory, self.DATA_FILE), indptr=self.indptr, docs=self.docs,
+                 tfs=self.tfs, doc_lengths=self.doc_lengths)
+        with open(os.path.join(directory, self.META_FILE), "w") as f:
+            json.dump({"terms": self.terms, "doc_ids": self.doc_ids, "exact": self.exact,
+                       "k1": self.k1, "b": self.b}, f)
+
+    @classmethod
+    def discard(cls, directory: str):
+        """Delete a saved index, so the next load_lexical_index() rebuilds it from data.csv"""
+        for name in (cls.DATA_FILE, cls.META_FILE):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BM25Index"]:
+        data_path = os.path.join(directory, cls.DATA_FILE)
+        meta_path = os.path.join(directory, cls.META_FILE)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        with np.load(data_path) as data:
+            return cls(meta["terms"], data["indptr"], data["docs"], data["tfs"], data["doc_lengths"],
+                       meta["doc_ids"], meta["exact"], meta["k1"], meta["b"])
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses dense vector and BM25 rankings with reciprocal rank fusion
+
+    Queries that exactly match an indexed title or heading take a lexical-only
+    fast path that never calls the embedding model.
+    """
+
+    vector_store: object
+    lexical_index: object
+    search_kwargs: dict = {"k": 5}
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def is_exact_match(self, query: str) -> bool:
+        """Whether query takes the lexical-only fast path, so its results involve no embedding"""
+        return bool(self.lexical_index.exact_lookup(query))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        k = self.search_kwargs.get("k", 5)
+
+        exact_ids = self.lexical_index.exact_lookup(query)
+        if exact_ids:
+            ranked = list(dict.fromkeys(exact_ids))
+            ranked += [doc_id for doc_id, _ in self.lexical_index.search(query, k) if doc_id not in ranked]
+            return self._documents(ranked[:k], {})
+
+        dense = self.vector_store.similarity_search(query, k=self.fetch_k)
+        lexical = self.lexical_index.search(query, self.fetch_k)
+
+        scores: Dict[str, float] = {}
+        for rank, doc in enumerate(dense):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, (doc_id, _) in enumerate(lexical):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+        return self._documents(ranked, {doc.id: doc for doc in dense})
+
+    def _documents(self, ids: List[str], known: Dict[str, Document]) -> List[Document]:
+        """Documents for ids in order, fetching any not already retrieved from the vector store"""
+        missing = [doc_id for doc_id in ids if doc_id not in known]
+        if missing:
+            known = {**known, **{doc.id: doc for doc in self.vector_store.get_by_ids(missing)}}
+        return [known[doc_id] for doc_id in ids if doc_id in known]
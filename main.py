@@ -1,18 +1,51 @@
 """
 Multi-Project RAG Application
 """
-from langchain_ollama.llms import OllamaLLM
 from project_manager import ProjectManager
-import re
+import argparse
+import time
+import threading
+from collections import deque
+from label_matcher import matcher_for
+from metrics import REGISTRY, count, observe, span
 
 
 class MultiProjectApp:
     """Main application handling multiple projects"""
     
-    def __init__(self):
-        self.model = OllamaLLM(model="llama3.2")
-        self.project_manager = ProjectManager()
+    llm_model = "llama3.2"
+    QUERY_METRICS_WINDOW = 1000
+
+    def __init__(self, projects_dir: str = "./projects", stream: bool = True,
+                 answer_cache_threshold: float = None, answer_cache_path: str = None):
+        self._model = None
+        self.project_manager = ProjectManager(projects_dir)
         self.current_project = None
+        self.stream = stream
+        # Recent per-answer metrics; the long-running server and batch mode keep only the latest ones
+        self.query_metrics = deque(maxlen=self.QUERY_METRICS_WINDOW)
+        # A threshold of None (the default) disables the semantic answer cache
+        self.answer_cache_threshold = answer_cache_threshold
+        self.answer_cache_path = answer_cache_path
+        self._answer_cache = None
+        self.warm_up_results = {}
+
+    @property
+    def model(self):
+        """LLM client, created on first query so startup doesn't import langchain_ollama"""
+        if self._model is None:
+            from model_backends import create_llm
+            self._model = create_llm(self.llm_model)
+        return self._model
+
+    @property
+    def answer_cache(self):
+        """Semantic answer cache, created on first query"""
+        if self._answer_cache is None and self.answer_cache_threshold is not None:
+            from answer_cache import SemanticAnswerCache
+            self._answer_cache = SemanticAnswerCache(threshold=self.answer_cache_threshold,
+                                                     path=self.answer_cache_path)
+        return self._answer_cache
         
     def initialize(self, force_refresh: bool = False):
         """Initialize all projects"""
@@ -25,9 +58,40 @@ class MultiProjectApp:
         else:
             print("No projects found. Please create projects in the ./projects directory.")
     
+    def watch_projects(self, interval: float = 2.0, debounce: float = 5.0):
+        """Sync projects in the background when their data.csv changes, reload changed prompts"""
+        self.project_manager.start_watcher(interval, debounce, on_change=self.on_project_change)
+        print(f"✓ Watching project files every {interval:g}s (changes settle after {debounce:g}s)")
+
+    def on_project_change(self, project_name: str, kind: str):
+        # Answers are keyed by index version, which a sync changes; a new prompt doesn't change it
+        if kind == "prompt" and self._answer_cache is not None:
+            self._answer_cache.invalidate(project_name)
+
+    def warm_up_models(self, background: bool = True):
+        """Load the LLM and every project's embedding model on the model server before the first query
+
+        In the background the app stays usable meanwhile; queries that arrive first just pay the load.
+        """
+        def run():
+            from model_backends import warm_up
+            self.warm_up_results = warm_up(self.project_manager.embedding_models(), self.llm_model)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
     def select_project(self, project_name: str):
         """Select active project"""
         if project_name in self.project_manager.list_projects():
+            try:
+                self.project_manager.get_project(project_name)
+            except Exception as e:
+                print(f"✗ Failed to load project {project_name}: {e}")
+                return
             self.current_project = project_name
             print(f"Selected project: {project_name}")
         else:
@@ -41,31 +105,124 @@ class MultiProjectApp:
             return
         
         try:
-            project = self.project_manager.get_project(self.current_project)
-            retriever = self.project_manager.get_retriever(self.current_project)
-            prompt_template = project.get_prompt_template()
-            
-            # Get relevant documents
-            docs = retriever.invoke(question)
-            context = "\n".join([doc.page_content for doc in docs])
-            
-            # Create chain and get response
-            chain = prompt_template | self.model
-            result = chain.invoke({"responses": context, "question": question})
-            
-            return result
+            return self.query_project(self.current_project, question)
         except Exception as e:
             print(f"Error querying project: {e}")
             return None
+
+    def query_project(self, project_name: str, question: str, stream: bool = None) -> str:
+        """Retrieve context from a project and generate an answer; errors propagate to the caller"""
+        with span("query.total"):
+            cached, embedding = self.lookup_cached_answer(project_name, question, stream)
+            if cached:
+                return cached["answer"]
+
+            docs = self.project_manager.retrieve(project_name, question)
+            return self.answer_from_documents(project_name, question, docs, embedding, stream)
+
+    def answer_from_documents(self, project_name: str, question: str, docs: list, embedding=None,
+                              stream: bool = None) -> str:
+        """Generate an answer from already retrieved documents and store it in the answer cache"""
+        project = self.project_manager.get_project(project_name)
+        prompt_template = project.prompt_template()
+        with span("query.context"):
+            context = project.build_context(docs)
+
+        with span("query.prompt_render"):
+            prompt = prompt_template.invoke({"responses": context.text, "question": question})
+        result = self.generate(self.model, prompt, project_name, stream, context)
+        self.store_cached_answer(project_name, question, embedding, result)
+        return result
+
+    def lookup_cached_answer(self, project_name: str, question: str, stream: bool = None):
+        """Find a cached answer to a near-duplicate question; returns (entry or None, question embedding)"""
+        if self.answer_cache is None:
+            return None, None
+        # Open the store first so the project's index version is known
+        self.project_manager.get_retriever(project_name)
+        with span("query.answer_cache"):
+            embedding = self.project_manager.get_project(project_name).embeddings.embed_query(question)
+            cached = self.answer_cache.lookup(project_name, self.project_manager.index_version(project_name),
+                                              embedding)
+        if cached and (self.stream if stream is None else stream):
+            print("\n" + cached["answer"] + "\n")
+            print(f"[cached answer, similarity {cached['similarity']:.3f} to \"{cached['question']}\"]")
+        return cached, embedding
+
+    def store_cached_answer(self, project_name: str, question: str, embedding, answer: str, extra: dict = None):
+        if self.answer_cache is not None and embedding is not None:
+            self.answer_cache.store(project_name, self.project_manager.index_version(project_name),
+                                    question, embedding, answer, extra)
     
+    def generate(self, chain, inputs, project_name: str = None, stream: bool = None, context=None) -> str:
+        """Run a chain or model, printing tokens as they arrive in stream mode, and record latency metrics
+
+        context is the PackedContext behind the prompt, if any, so its size is recorded too.
+        """
+        from model_backends import RESIDENCY
+        stream = self.stream if stream is None else stream
+        warm = RESIDENCY.touch(self.llm_model)
+        start = time.perf_counter()
+        first_token = None
+        chunks = []
+        if stream:
+            print()
+            for chunk in chain.stream(inputs):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                chunks.append(chunk)
+                print(chunk, end="", flush=True)
+            print("\n")
+            result = "".join(chunks)
+        else:
+            result = chain.invoke(inputs)
+            first_token = time.perf_counter()
+        end = time.perf_counter()
+
+        # Ollama streams roughly one token per chunk; without streaming, estimate the same way as contexts
+        if stream:
+            tokens = len(chunks)
+        else:
+            from context_builder import estimate_tokens
+            tokens = estimate_tokens(result)
+        generation_time = (end - first_token) if stream and first_token else (end - start)
+        metrics = {
+            "project": project_name or self.current_project,
+            "streamed": stream,
+            "time_to_first_token": (first_token or end) - start,
+            "total_time": end - start,
+            "tokens": tokens,
+            "tokens_per_sec": tokens / generation_time if generation_time > 0 else 0.0,
+            "model_warm": warm,
+        }
+        if context is not None:
+            metrics.update(context_tokens=context.tokens, context_tokens_saved=context.tokens_saved,
+                           context_documents=context.documents)
+            # Totals for both stream and non-stream answers, shown by 'stats' and served at /metrics
+            count("context.prompts")
+            count("context.tokens", context.tokens)
+            count("context.tokens_saved", context.tokens_saved)
+        self.query_metrics.append(metrics)
+        # Cold requests waited for the server to load the model; tracked apart so they don't skew warm latency
+        state = "warm" if warm else "cold"
+        observe("llm.total", metrics["total_time"])
+        observe(f"llm.total.{state}", metrics["total_time"])
+        if stream and first_token:
+            observe("llm.prefill", metrics["time_to_first_token"])
+            observe(f"llm.prefill.{state}", metrics["time_to_first_token"])
+            observe("llm.generation", end - first_token)
+        if stream:
+            context_note = (f", context {context.tokens} tokens from {context.documents} docs "
+                            f"(saved {context.tokens_saved})" if context is not None else "")
+            cold_note = "" if warm else ", cold model"
+            print(f"[first token {metrics['time_to_first_token']:.2f}s, "
+                  f"{metrics['tokens_per_sec']:.1f} tokens/sec, total {metrics['total_time']:.2f}s"
+                  f"{context_note}{cold_note}]")
+        return result
+
     def extract_llm_labels(self, llm_output, candidate_labels):
-        """Extract only those candidate labels that appear in the LLM output (case-insensitive)"""
-        selected = []
-        for label in candidate_labels:
-            # Use word boundary for exact match, fallback to substring if needed
-            if re.search(rf"\\b{re.escape(label)}\\b", llm_output, re.IGNORECASE) or label in llm_output:
-                selected.append(label)
-        return selected
+        """Extract only those candidate labels that appear in the LLM output (case-insensitive, whole words)"""
+        return matcher_for(candidate_labels).labels_in(llm_output)
     
     def query_with_label_extraction(self, question: str):
         """Special query method for LCSH project that extracts specific labels"""
@@ -73,35 +230,117 @@ class MultiProjectApp:
             return self.query_current_project(question)
         
         try:
-            retriever = self.project_manager.get_retriever(self.current_project)
-            docs = retriever.invoke(question)
-            candidate_labels = [doc.page_content for doc in docs]
-            formatted_labels = "\\n".join(f"- {label}" for label in candidate_labels)
-            
-            project = self.project_manager.get_project(self.current_project)
-            prompt_template = project.get_prompt_template()
-            chain = prompt_template | self.model
-            
-            result = chain.invoke({"responses": formatted_labels, "question": question})
-            selected_labels = self.extract_llm_labels(result, candidate_labels)
+            if self.stream:
+                print("Explanation from LLM:\n")
+            result, selected_labels = self.query_project_labels(self.current_project, question)
             
+            matcher = matcher_for(selected_labels)
+            first_match = {}
+            for match in matcher.find_all(result):
+                first_match.setdefault(match.label, match)
+
             print("LLM-selected subject headings from the database:")
             for i, label in enumerate(selected_labels, 1):
-                print(f"{i}. {label}")
-            print("\\nExplanation from LLM:\\n")
+                match = first_match.get(label)
+                print(f"{i}. {label}" + (f" (chars {match.start}-{match.end})" if match else ""))
+            if not self.stream:
+                print("\\nExplanation from LLM:\\n")
             
-            return result
+            return matcher.highlight(result)
         except Exception as e:
             print(f"Error querying project: {e}")
             return None
-    
+
+    def query_project_labels(self, project_name: str, question: str, stream: bool = None):
+        """Generate an answer from candidate labels and return it with the labels the LLM selected"""
+        with span("query.total"):
+            cached, embedding = self.lookup_cached_answer(project_name, question, stream)
+            if cached:
+                return cached["answer"], cached["extra"].get("labels", [])
+
+            docs = self.project_manager.retrieve(project_name, question)
+            return self.labels_from_documents(project_name, question, docs, embedding, stream)
+
+    def labels_from_documents(self, project_name: str, question: str, docs: list, embedding=None,
+                              stream: bool = None):
+        """query_project_labels() for already retrieved documents"""
+        candidate_labels = [doc.page_content for doc in docs]
+        formatted_labels = "\\n".join(f"- {label}" for label in candidate_labels)
+
+        project = self.project_manager.get_project(project_name)
+        prompt_template = project.prompt_template()
+        with span("query.prompt_render"):
+            prompt = prompt_template.invoke({"responses": formatted_labels, "question": question})
+
+        result = self.generate(self.model, prompt, project_name, stream)
+        with span("query.label_extraction"):
+            selected_labels = self.extract_llm_labels(result, candidate_labels)
+        self.store_cached_answer(project_name, question, embedding, result, {"labels": selected_labels})
+        return result, selected_labels
+
+    def run_batch(self, input_path: str, output_path: str = None, project_name: str = None,
+                  llm_workers: int = 4) -> list:
+        """Answer a JSONL/CSV/markdown file of questions; project_name covers rows without one"""
+        from batch_query import BatchRunner, default_output_path, load_batch
+        items = load_batch(input_path, project_name or self.current_project)
+        return BatchRunner(self, llm_workers).run(items, output_path or default_output_path(input_path))
+
+    def print_stage_stats(self):
+        """Print p50/p95/p99 latency for every timed stage"""
+        if not REGISTRY.enabled:
+            print("Stage timing is disabled (RAG_METRICS=0).")
+        elif not REGISTRY.snapshot() and not REGISTRY.counters():
+            print("No stages timed yet.")
+        else:
+            print(REGISTRY.format_table())
+
+    def export_stage_stats(self, path: str):
+        """Write stage histograms as JSON lines (.jsonl) or Prometheus text (anything else)"""
+        if path.endswith(".jsonl"):
+            REGISTRY.write_jsonl(path)
+        else:
+            with open(path, "w") as f:
+                f.write(REGISTRY.to_prometheus())
+        print(f"Exported stage metrics to {path}")
+
+    def print_cache_stats(self):
+        """Print hit/miss counters for the answer, retrieval and embedding caches"""
+        if self.answer_cache is not None:
+            stats = self.answer_cache.stats()
+            print(f"Answer cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries, threshold {stats['threshold']}")
+            if stats["similarity_percentiles"]:
+                print("  best-match similarity: " + ", ".join(
+                    f"{name}={value:.3f}" for name, value in stats["similarity_percentiles"].items()))
+                print("  histogram: " + ", ".join(
+                    f"{bucket}: {count}" for bucket, count in stats["similarity_histogram"].items()))
+        else:
+            print("Answer cache: off (start with --answer-cache to reuse answers to near-duplicate questions)")
+        stats = self.project_manager.retrieval_cache.stats()
+        print(f"Retrieval cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['entries']}/{stats['max_entries']} entries")
+        from embedding_cache import EmbeddingCache
+        for cache in EmbeddingCache._instances.values():
+            stats = cache.stats()
+            print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} vectors, "
+                  f"{stats['bytes'] / 1024 ** 2:.1f} MB")
+
     def run_interactive(self):
         """Run interactive mode"""
         print("Multi-Project RAG System")
         print("Commands:")
         print("  list - List available projects")
         print("  select <project_name> - Select a project")
-        print("  refresh <project_name> - Refresh vector store for a project")
+        print("  refresh <project_name> - Rebuild vector store for a project in the background")
+        print("    (queries use the current store until the new one is built and checked)")
+        print("  sync <project_name> - Re-embed only changed rows for a project")
+        print("  stream on|off - Print answers token by token as they are generated")
+        print("  cache - Show answer, retrieval and embedding cache statistics")
+        print("  batch <file> [output] - Answer a JSONL, CSV or markdown file of questions")
+        print("    (rows without a project use the selected one; results go to <file>.results.jsonl)")
+        print("  stats [export <file>] - Show per-stage latency percentiles, or export them")
+        print("    (Prometheus text, or JSON lines if the file ends in .jsonl)")
         print("  q - Quit")
         print()
         
@@ -117,9 +356,11 @@ class MultiProjectApp:
                 print("Application exited.")
                 break
             elif user_input.lower() == "list":
-                projects = self.project_manager.list_projects()
+                projects = self.project_manager.describe_projects()
                 if projects:
-                    print(f"Available projects: {', '.join(projects)}")
+                    print("Available projects:")
+                    for info in projects:
+                        print(f"  {info['name']}" + (f" - {info['description']}" if info["description"] else ""))
                 else:
                     print("No projects available.")
             elif user_input.lower().startswith("select "):
@@ -128,8 +369,30 @@ class MultiProjectApp:
             elif user_input.lower().startswith("refresh "):
                 project_name = user_input[8:].strip()
                 if project_name in self.project_manager.list_projects():
-                    print(f"Refreshing vector store for {project_name}...")
-                    self.project_manager.refresh_project(project_name)
+                    print(f"Rebuilding vector store for {project_name} in the background...")
+                    self.project_manager.refresh_project(project_name, background=True)
+                else:
+                    print(f"Project '{project_name}' not found.")
+            elif user_input.lower() == "cache":
+                self.print_cache_stats()
+            elif user_input.lower().startswith("batch "):
+                paths = user_input[6:].split()
+                try:
+                    self.run_batch(paths[0], paths[1] if len(paths) > 1 else None)
+                except Exception as e:
+                    print(f"Error running batch: {e}")
+            elif user_input.lower() == "stats":
+                self.print_stage_stats()
+            elif user_input.lower().startswith("stats export "):
+                self.export_stage_stats(user_input[13:].strip())
+            elif user_input.lower() in ("stream on", "stream off"):
+                self.stream = user_input.lower().endswith("on")
+                print(f"Streaming {'enabled' if self.stream else 'disabled'}.")
+            elif user_input.lower().startswith("sync "):
+                project_name = user_input[5:].strip()
+                if project_name in self.project_manager.list_projects():
+                    print(f"Syncing vector store for {project_name}...")
+                    self.project_manager.sync_project(project_name)
                 else:
                     print(f"Project '{project_name}' not found.")
             else:
@@ -139,13 +402,107 @@ class MultiProjectApp:
                 else:
                     result = self.query_current_project(user_input)
                 
-                if result:
+                if result and not self.stream:
                     print("\n" + result + "\n")
 
 
+def add_answer_cache_arguments(parser: argparse.ArgumentParser):
+    # Off by default: a wrong threshold silently answers a different question, so tune it first
+    # against the similarity histogram the 'cache' command prints
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Reuse answers to near-duplicate questions (semantic answer cache)")
+    parser.add_argument("--answer-cache-threshold", type=float, default=0.95,
+                        help="Cosine similarity above which a cached answer is reused (with --answer-cache)")
+    parser.add_argument("--answer-cache-path", default=None,
+                        help="Persist the semantic answer cache to this JSON lines file (with --answer-cache)")
+
+
+def add_model_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--keep-alive", type=int, default=None,
+                        help="Seconds the model server keeps models loaded after a request, -1 for always "
+                             "(default: RAG_MODEL_KEEP_ALIVE or 3600)")
+    parser.add_argument("--no-warm-up", action="store_true",
+                        help="Don't load the LLM and embedding models in the background at startup")
+
+
+def add_watch_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--watch", action="store_true",
+                        help="Sync a project in the background when its data.csv changes, "
+                             "and reload its prompt when prompt.txt changes")
+    parser.add_argument("--watch-interval", type=float, default=2.0, help="Seconds between file polls")
+    parser.add_argument("--watch-debounce", type=float, default=5.0,
+                        help="Seconds a changed file must stay unchanged before it is acted on")
+
+
+def apply_watch_arguments(app, args):
+    if args.watch:
+        app.watch_projects(args.watch_interval, args.watch_debounce)
+
+
+def apply_model_arguments(args):
+    if args.keep_alive is not None:
+        from model_backends import set_keep_alive
+        set_keep_alive(args.keep_alive)
+
+
+def answer_cache_options(args) -> dict:
+    return {
+        "answer_cache_threshold": args.answer_cache_threshold if args.answer_cache else None,
+        "answer_cache_path": args.answer_cache_path,
+    }
+
+
 def main():
-    app = MultiProjectApp()
+    parser = argparse.ArgumentParser(description="Multi-Project RAG System")
+    add_answer_cache_arguments(parser)
+    add_model_arguments(parser)
+    add_watch_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command")
+    build_parser = subparsers.add_parser("build-all", help="Build all project vector stores concurrently")
+    build_parser.add_argument("projects", nargs="*", help="Projects to build (default: all)")
+    build_parser.add_argument("--workers", type=int, default=3, help="Projects built at once")
+    build_parser.add_argument("--embedding-concurrency", type=int, default=4,
+                              help="Total in-flight embedding requests across all projects")
+    build_parser.add_argument("--sync", action="store_true",
+                              help="Incrementally sync existing stores instead of rebuilding them")
+    gc_parser = subparsers.add_parser("gc", help="Delete vector store versions left behind by killed rebuilds "
+                                                 "(only while no other process is serving)")
+    gc_parser.add_argument("projects", nargs="*", help="Projects to clean up (default: all)")
+    batch_parser = subparsers.add_parser("batch", help="Answer a file of (project, question) pairs")
+    batch_parser.add_argument("input", help="JSONL or CSV with project and question fields, or a markdown "
+                                            "file of bold quoted questions such as SEARCH_TOPICS.md")
+    batch_parser.add_argument("--output", help="Results JSONL (default: <input>.results.jsonl)")
+    batch_parser.add_argument("--project", help="Project for rows that don't name one")
+    batch_parser.add_argument("--llm-workers", type=int, default=4,
+                              help="Concurrent LLM generations (match OLLAMA_NUM_PARALLEL)")
+    args = parser.parse_args()
+    apply_model_arguments(args)
+
+    if args.command == "build-all":
+        manager = ProjectManager()
+        results = manager.build_all(args.projects, workers=args.workers,
+                                    embedding_concurrency=args.embedding_concurrency, incremental=args.sync)
+        raise SystemExit(0 if all(r["status"] == "ok" for r in results) else 1)
+
+    if args.command == "gc":
+        manager = ProjectManager()
+        for project_name in args.projects or manager.list_projects():
+            manager.get_project(project_name).sweep_stores()
+        raise SystemExit(0)
+
+    if args.command == "batch":
+        app = MultiProjectApp(stream=False, **answer_cache_options(args))
+        app.initialize()
+        if not args.no_warm_up:
+            app.warm_up_models()
+        results = app.run_batch(args.input, args.output, args.project, args.llm_workers)
+        raise SystemExit(0 if all(r["error"] is None for r in results) else 1)
+
+    app = MultiProjectApp(**answer_cache_options(args))
     app.initialize()
+    if not args.no_warm_up:
+        app.warm_up_models()
+    apply_watch_arguments(app, args)
     app.run_interactive()
 
 
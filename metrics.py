@@ -0,0 +1,180 @@
+"""
+Lightweight timing spans aggregated into per-stage latency histograms
+
+    with span("query.retrieve"):
+        ...
+
+Spans are on unless RAG_METRICS=0; when disabled, span() returns a shared
+no-op context manager, so instrumented code pays one function call.
+Quantities that aren't durations, such as prompt tokens saved, are summed
+with count(). Histograms and counters export as Prometheus text or JSON lines.
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+import numpy as np
+
+
+# Upper bounds in seconds for Prometheus buckets, roughly x2.5 apart from 1ms to 5min
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 150.0, 300.0)
+
+
+class Histogram:
+    """Cumulative bucket counts for export plus a window of recent samples for percentiles"""
+
+    def __init__(self, window: int = 4096):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            self.recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = np.asarray(self.recent)
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]).tolist() if len(samples) else (0.0, 0.0, 0.0)
+        return {"count": count, "sum": total, "p50": p50, "p95": p95, "p99": p99,
+                "max": float(samples.max()) if len(samples) else 0.0, "buckets": counts}
+
+
+class MetricsRegistry:
+    """Histograms keyed by stage name"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    def increment(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {stage: histograms[stage].snapshot() for stage in sorted(histograms)}
+
+    def to_prometheus(self, name: str = "rag_stage_seconds") -> str:
+        """Prometheus text exposition format, one histogram series per stage"""
+        lines = [f"# HELP {name} Time spent per pipeline stage", f"# TYPE {name} histogram"]
+        for stage, snap in self.snapshot().items():
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, "+Inf"), snap["buckets"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {snap["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {snap["count"]}')
+        counters = self.counters()
+        if counters:
+            lines += ["# HELP rag_total Running totals such as prompt context tokens", "# TYPE rag_total counter"]
+            lines += [f'rag_total{{name="{counter}"}} {total}' for counter, total in counters.items()]
+        return "\n".join(lines) + "\n"
+
+    def write_jsonl(self, path: str):
+        """Append one JSON line per stage with its count, sum and percentiles"""
+        now = time.time()
+        with open(path, "a") as f:
+            for stage, snap in self.snapshot().items():
+                snap.pop("buckets")
+                f.write(json.dumps({"timestamp": now, "stage": stage, **snap}) + "\n")
+            for counter, total in self.counters().items():
+                f.write(json.dumps({"timestamp": now, "counter": counter, "total": total}) + "\n")
+
+    def format_table(self, stages: Optional[List[str]] = None) -> str:
+        """Per-stage count and p50/p95/p99 in milliseconds"""
+        snapshot = self.snapshot()
+        rows = [f"{'stage':<32} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+        for stage in stages or snapshot:
+            snap = snapshot.get(stage)
+            if snap:
+                rows.append(f"{stage:<32} {snap['count']:>7} {snap['p50'] * 1000:>9.1f} "
+                            f"{snap['p95'] * 1000:>9.1f} {snap['p99'] * 1000:>9.1f}")
+        counters = self.counters()
+        if counters and not stages:
+            rows.append(f"\n{'counter':<32} {'total':>17}")
+            rows += [f"{counter:<32} {total:>17g}" for counter, total in counters.items()]
+        return "\n".join(rows)
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+REGISTRY = MetricsRegistry(enabled=os.environ.get("RAG_METRICS", "1") != "0")
+
+
+def span(stage: str):
+    """Context manager timing a block into the stage's histogram"""
+    return _Span(stage) if REGISTRY.enabled else _NULL_SPAN
+
+
+def observe(stage: str, seconds: float):
+    """Record a duration measured elsewhere"""
+    REGISTRY.observe(stage, seconds)
+
+
+def count(name: str, value: float = 1):
+    """Add value to a running total"""
+    REGISTRY.increment(name, value)
+
+
+def set_enabled(enabled: bool):
+    REGISTRY.enabled = enabled
@@ -0,0 +1,204 @@
+"""
+Factory for embedding and LLM clients, switchable between Ollama and offline stubs
+
+The backend defaults to the RAG_MODEL_BACKEND environment variable ("ollama" or
+"stub") and can be changed at runtime with use_backend().
+
+Clients are created once per model and shared, and every Ollama client sends its
+requests through one pooled HTTP transport, passed in through the public client
+constructor arguments. Each request asks the server to keep the model loaded for
+RAG_MODEL_KEEP_ALIVE seconds (-1 keeps it loaded until the server restarts).
+warm_up() loads models ahead of the first query and reports cold (load) versus
+warm latency.
+"""
+import os
+import time
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from embedding_cache import CachedEmbeddings
+from metrics import observe
+
+
+BACKENDS = ("ollama", "stub")
+_backend = os.environ.get("RAG_MODEL_BACKEND", "ollama")
+_stub_options = {}
+# Seconds the server keeps a model loaded after its last request; Ollama's own default is 300
+keep_alive = int(os.environ.get("RAG_MODEL_KEEP_ALIVE", "3600"))
+# Embedding model of projects that don't set their own
+DEFAULT_EMBEDDING_MODEL = "mxbai-embed-large"
+# Connections kept open to the Ollama server, shared by embedding and generation calls
+POOL_CONNECTIONS = 16
+
+_lock = threading.Lock()
+_transport = None
+_ollama_client = None
+_clients: Dict[Tuple[str, str], object] = {}
+
+
+def use_backend(name: str, **stub_options):
+    """Select the model backend; stub_options are passed to the stub embedding and LLM classes"""
+    global _backend, _stub_options
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    with _lock:
+        _backend = name
+        _stub_options = stub_options
+        _clients.clear()
+    RESIDENCY.reset()
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_keep_alive(seconds: int):
+    """Keep-alive for clients created from now on; call before the first query"""
+    global keep_alive
+    with _lock:
+        keep_alive = seconds
+        _clients.clear()
+
+
+def http_transport():
+    """The httpx transport, and so the connection pool, that every synchronous Ollama request goes through"""
+    global _transport
+    with _lock:
+        if _transport is None:
+            import httpx
+            _transport = httpx.HTTPTransport(limits=httpx.Limits(max_connections=POOL_CONNECTIONS,
+                                                                 max_keepalive_connections=POOL_CONNECTIONS))
+        return _transport
+
+
+def _client_kwargs() -> dict:
+    """Constructor arguments that route a langchain-ollama client's requests through http_transport()
+
+    Only the transport is shared; each client still connects to its own base_url
+    (by default OLLAMA_HOST).
+    """
+    return {"sync_client_kwargs": {"transport": http_transport()}}
+
+
+def ollama_client():
+    """ollama.Client on the shared transport, for requests that don't go through a model client"""
+    global _ollama_client
+    transport = http_transport()
+    with _lock:
+        if _ollama_client is None:
+            from ollama import Client
+            # host=None lets the client read OLLAMA_HOST
+            _ollama_client = Client(transport=transport)
+        return _ollama_client
+
+
+def _shared(kind: str, model: str, factory):
+    key = (kind, model)
+    with _lock:
+        client = _clients.get(key)
+    if client is None:
+        client = factory()
+        with _lock:
+            client = _clients.setdefault(key, client)
+    return client
+
+
+def _stub_kwargs(names: Iterable[str]) -> dict:
+    return {k: v for k, v in _stub_options.items() if k in names}
+
+
+def create_embeddings(model: str):
+    """Embedding client for the current backend, wrapped in the shared on-disk embedding cache"""
+    if _backend == "stub":
+        from stub_backends import StubEmbeddings
+        options = _stub_kwargs(("dimensions", "latency", "per_text_latency", "load_latency"))
+        # Stub vectors get their own cache namespace so they never mix with real ones
+        return _shared("embedding", model, lambda: CachedEmbeddings(
+            StubEmbeddings(keep_alive=keep_alive, **options), model_name=f"stub/{model}"))
+
+    def factory():
+        from langchain_ollama import OllamaEmbeddings
+        embeddings = OllamaEmbeddings(model=model, keep_alive=keep_alive, **_client_kwargs())
+        return CachedEmbeddings(embeddings, model_name=model)
+    return _shared("embedding", model, factory)
+
+
+def create_llm(model: str):
+    """LLM client for the current backend"""
+    if _backend == "stub":
+        from stub_backends import StubLLM
+        options = _stub_kwargs(("prefill_latency", "prefill_token_latency", "prefix_cache", "token_latency",
+                                "answer_tokens", "load_latency"))
+        return _shared("llm", model, lambda: StubLLM(keep_alive=keep_alive, **options))
+
+    def factory():
+        from langchain_ollama.llms import OllamaLLM
+        return OllamaLLM(model=model, keep_alive=keep_alive, **_client_kwargs())
+    return _shared("llm", model, factory)
+
+
+class ModelResidency:
+    """Client-side view of which models the server still has loaded
+
+    A model counts as warm if this process used it within keep_alive seconds;
+    the first request after that waits for the server to load it again.
+    """
+
+    def __init__(self):
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, model: str) -> bool:
+        """Record a request to model; returns whether it was warm beforehand"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_used.get(model)
+            self._last_used[model] = now
+        return last is not None and (keep_alive < 0 or now - last <= keep_alive)
+
+    def reset(self):
+        with self._lock:
+            self._last_used.clear()
+
+
+RESIDENCY = ModelResidency()
+
+
+def _ping(kind: str, model: str):
+    """Smallest request that makes the server load model"""
+    if _backend == "stub":
+        if kind == "embedding":
+            create_embeddings(model).embeddings.embed_query("warm-up")
+        else:
+            create_llm(model).invoke("warm-up")
+    elif kind == "embedding":
+        ollama_client().embed(model, "warm-up", keep_alive=keep_alive)
+    else:
+        # An empty prompt loads the model without generating anything
+        ollama_client().generate(model, prompt="", keep_alive=keep_alive)
+
+
+def warm_up(embedding_models: Iterable[str] = (), llm_model: Optional[str] = None) -> Dict[str, dict]:
+    """Load each model with a tiny request, then repeat it to measure warm latency
+
+    Returns {model: {"cold": seconds, "warm": seconds}}; models that fail are reported and skipped.
+    """
+    models = [("embedding", model) for model in dict.fromkeys(embedding_models)]
+    if llm_model:
+        models.append(("llm", llm_model))
+    results = {}
+    for kind, model in models:
+        try:
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                _ping(kind, model)
+                timings.append(time.perf_counter() - start)
+                RESIDENCY.touch(model)
+        except Exception as e:
+            print(f"✗ Failed to warm up {model}: {e}")
+            continue
+        results[model] = {"cold": timings[0], "warm": timings[1]}
+        observe("model.warm_up", timings[0])
+        print(f"✓ Warmed up {model}: cold {timings[0]:.2f}s, warm {timings[1]:.2f}s")
+    return results
+
@@ -2,18 +2,49 @@
 Project manager for handling multiple RAG projects
 """
 import os
+import ast
+import time
+import threading
 import importlib.util
-from typing import Dict, List
-from base_project import BaseProject
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from retrieval_cache import RetrievalCache
+from metrics import span
+from typing import TYPE_CHECKING, Dict, List
+
+# base_project pulls in pandas and langchain, so it is only imported when a project is loaded
+if TYPE_CHECKING:
+    from base_project import BaseProject
 
 
 class ProjectManager:
-    """Manages multiple projects and their vector stores"""
+    """Manages multiple projects and their vector stores
+
+    Startup only discovers project directories and reads lightweight metadata;
+    a project's module, embedding client and vector store are built on first use.
+    """
     
     def __init__(self, projects_dir: str = "./projects"):
         self.projects_dir = projects_dir
-        self.projects: Dict[str, BaseProject] = {}
+        self.project_info: Dict[str, dict] = {}
+        self.projects: Dict[str, "BaseProject"] = {}
         self.retrievers: Dict[str, any] = {}
+        # Changes whenever a project's store is rebuilt or synced; part of every retrieval cache key
+        self.index_versions: Dict[str, str] = {}
+        self.retrieval_cache = RetrievalCache()
+        # Per-project locks so concurrent callers (build-all, the HTTP service) load each project once
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+        # Held for a whole build or sync, so rebuilds of one project never overlap
+        self._build_locks: Dict[str, threading.Lock] = {}
+        # Queries in flight per retriever (by id), and (project, retriever, directory) of stores a
+        # rebuild replaced, deleted once their retriever has no queries left
+        self._in_flight: Dict[int, int] = {}
+        self._retired: List[tuple] = []
+        self._drain_lock = threading.Lock()
+        # Background rebuild threads by project
+        self.rebuilds: Dict[str, threading.Thread] = {}
+        self.watcher = None
         
     def discover_projects(self) -> List[str]:
         """Discover all project directories"""
@@ -30,70 +61,315 @@ class ProjectManager:
                     projects.append(item)
         return projects
     
-    def load_project(self, project_name: str) -> BaseProject:
+    def read_project_info(self, project_name: str) -> dict:
+        """Read class name, description and embedding_model from project.py without importing it
+
+        embedding_model is None unless the class assigns it a string literal.
+        """
+        project_file = os.path.join(self.projects_dir, project_name, "project.py")
+        info = {"name": project_name, "class_name": None, "description": "", "embedding_model": None}
+        try:
+            with open(project_file, 'r') as f:
+                tree = ast.parse(f.read(), filename=project_file)
+        except (OSError, SyntaxError):
+            return info
+
+        docstring = (ast.get_docstring(tree) or "").strip()
+        info["description"] = docstring.splitlines()[0] if docstring else ""
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef) and any(
+                getattr(base, "id", None) == "BaseProject" for base in node.bases
+            ):
+                info["class_name"] = node.name
+                for statement in node.body:
+                    if (isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Constant)
+                            and isinstance(statement.value.value, str)
+                            and any(getattr(target, "id", None) == "embedding_model" for target in statement.targets)):
+                        info["embedding_model"] = statement.value.value
+                break
+        return info
+
+    def load_project(self, project_name: str) -> "BaseProject":
         """Load a project class from its project.py file"""
+        from base_project import BaseProject
+
         project_dir = os.path.join(self.projects_dir, project_name)
         project_file = os.path.join(project_dir, "project.py")
         
         # Dynamically import the project module
-        spec = importlib.util.spec_from_file_location(f"{project_name}_project", project_file)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
+        with span("project.load"):
+            spec = importlib.util.spec_from_file_location(f"{project_name}_project", project_file)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
         
-        # Find the project class (should inherit from BaseProject)
+        # Find the project class (should inherit from BaseProject), trying the one read_project_info found first
         project_class = None
-        for attr_name in dir(module):
-            attr = getattr(module, attr_name)
-            if (isinstance(attr, type) and 
-                issubclass(attr, BaseProject) and 
-                attr != BaseProject):
-                project_class = attr
-                break
+        class_name = self.project_info.get(project_name, {}).get("class_name")
+        candidate = getattr(module, class_name, None) if class_name else None
+        if isinstance(candidate, type) and issubclass(candidate, BaseProject) and candidate != BaseProject:
+            project_class = candidate
+        else:
+            for attr_name in dir(module):
+                attr = getattr(module, attr_name)
+                if (isinstance(attr, type) and 
+                    issubclass(attr, BaseProject) and 
+                    attr != BaseProject):
+                    project_class = attr
+                    break
         
         if not project_class:
             raise ValueError(f"No BaseProject subclass found in {project_file}")
         
-        return project_class(project_name, project_dir)
+        project = project_class(project_name, project_dir)
+        project.manager = self
+        return project
 
     def initialize_all_projects(self, force_refresh: bool = False):
-        """Load all discovered projects, optionally create/refresh vector stores"""
+        """Register all discovered projects, optionally create/refresh vector stores
+
+        Projects are only imported here when force_refresh is set; otherwise they
+        load on first use through get_project/get_retriever.
+        """
         project_names = self.discover_projects()
         for project_name in project_names:
-            try:
-                print(f"Loading project: {project_name}")
-                project = self.load_project(project_name)
-                self.projects[project_name] = project
-                print(f"✓ Successfully loaded project: {project_name}")
-                if force_refresh:
+            self.project_info[project_name] = self.read_project_info(project_name)
+            if force_refresh:
+                try:
+                    print(f"Loading project: {project_name}")
+                    self.get_project(project_name)
+                    print(f"✓ Successfully loaded project: {project_name}")
                     self.create_vector_store(project_name, force_refresh=True)
-            except Exception as e:
-                print(f"✗ Failed to load project {project_name}: {e}")
+                except Exception as e:
+                    print(f"✗ Failed to load project {project_name}: {e}")
 
-    def create_vector_store(self, project_name: str, force_refresh: bool = False):
-        """Create or refresh vector store for a single project on demand."""
-        if project_name not in self.projects:
-            self.projects[project_name] = self.load_project(project_name)
+    def create_vector_store(self, project_name: str, force_refresh: bool = False, incremental: bool = False,
+                            embedding_slots=None):
+        """Create, refresh or incrementally sync vector store for a single project on demand.
+
+        A refresh builds the new store while the current retriever keeps serving,
+        then swaps it in (see rebuild).
+        """
+        if force_refresh:
+            self.rebuild(project_name, embedding_slots)
+            return
+        project = self.get_project(project_name)
+        # Syncs write to the live store, so they wait for a running rebuild; opening it doesn't
+        build_lock = self.build_lock(project_name) if incremental else contextlib.nullcontext()
+        with build_lock, self.project_lock(project_name), span("project.create_vector_store"):
+            retriever = project.create_vector_store(incremental=incremental, embedding_slots=embedding_slots)
+            self.retrievers[project_name] = retriever
+            self.index_versions[project_name] = project.index_version()
+            if incremental:
+                self.retrieval_cache.invalidate(project_name)
+        print(f"✓ Vector store {'synced' if incremental else 'created'} for project: {project_name}")
+
+    def rebuild(self, project_name: str, embedding_slots=None):
+        """Rebuild a project's store into a staging directory and swap it in once it passes check_store
+
+        Queries keep using the current retriever during the build. The swap is a
+        single assignment under the drain lock; the replaced store is deleted
+        when the last query holding its retriever finishes.
+        """
         project = self.get_project(project_name)
-        retriever = project.create_vector_store(force_refresh=force_refresh)
-        self.retrievers[project_name] = retriever
-        print(f"✓ Vector store {'refreshed' if force_refresh else 'created'} for project: {project_name}")
+        with self.build_lock(project_name):
+            with span("project.rebuild"):
+                location, retriever = project.build_staged_store(embedding_slots)
+            with self.project_lock(project_name), self._drain_lock:
+                previous_retriever = self.retrievers.get(project_name)
+                previous = project.activate_store(location)
+                self.retrievers[project_name] = retriever
+                self.index_versions[project_name] = project.index_version()
+                if previous:
+                    self._retired.append((project_name, previous_retriever, previous))
+            self.retrieval_cache.invalidate(project_name)
+        print(f"✓ Vector store refreshed for project: {project_name}")
+        self.collect_retired()
+
+    def collect_retired(self):
+        """Delete stores replaced by a rebuild whose retriever has no queries in flight"""
+        with self._drain_lock:
+            drained = [entry for entry in self._retired if not self._in_flight.get(id(entry[1]))]
+            self._retired = [entry for entry in self._retired if self._in_flight.get(id(entry[1]))]
+            draining = {}
+            for project_name, _, location in self._retired:
+                draining.setdefault(project_name, []).append(location)
+        for project_name, _, location in drained:
+            self.get_project(project_name).remove_store(location)
+            print(f"✓ Removed previous vector store for {project_name}: {location}")
+        # Versions left by killed or failed rebuilds, except stores that are still draining
+        for project_name in dict.fromkeys(project_name for project_name, _, _ in drained):
+            self.get_project(project_name).sweep_stores(keep=draining.get(project_name, ()))
 
+    def project_lock(self, project_name: str) -> threading.RLock:
+        with self._locks_guard:
+            return self._locks.setdefault(project_name, threading.RLock())
 
-    def get_project(self, project_name: str) -> BaseProject:
-        """Get a loaded project"""
+    def build_lock(self, project_name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._build_locks.setdefault(project_name, threading.Lock())
+
+    def get_project(self, project_name: str) -> "BaseProject":
+        """Get a project, loading its module on first use"""
         if project_name not in self.projects:
-            raise ValueError(f"Project {project_name} not loaded")
+            with self.project_lock(project_name):
+                if project_name not in self.projects:
+                    if project_name not in self.project_info and project_name not in self.discover_projects():
+                        raise ValueError(f"Project {project_name} not found")
+                    self.projects[project_name] = self.load_project(project_name)
         return self.projects[project_name]
 
     def get_retriever(self, project_name: str):
         if project_name not in self.retrievers:
-            self.create_vector_store(project_name)
+            with self.project_lock(project_name):
+                if project_name not in self.retrievers:
+                    self.create_vector_store(project_name)
         return self.retrievers[project_name]
     
+    def index_version(self, project_name: str) -> str:
+        return self.index_versions.get(project_name, "0")
+
+    @contextlib.contextmanager
+    def lease_retriever(self, project_name: str):
+        """The project's current retriever, counted as in use until the block exits
+
+        A rebuild that swaps the retriever meanwhile leaves its store on disk
+        until every lease on it has been released.
+        """
+        self.get_retriever(project_name)
+        with self._drain_lock:
+            retriever = self.retrievers[project_name]
+            self._in_flight[id(retriever)] = self._in_flight.get(id(retriever), 0) + 1
+        try:
+            yield retriever
+        finally:
+            with self._drain_lock:
+                self._in_flight[id(retriever)] -= 1
+                if not self._in_flight[id(retriever)]:
+                    del self._in_flight[id(retriever)]
+                retired = bool(self._retired)
+            if retired:
+                self.collect_retired()
+
+    def retrieve(self, project_name: str, question: str) -> list:
+        """Retrieve documents for a question, served from the retrieval cache when possible"""
+        with self.lease_retriever(project_name) as retriever:
+            k = getattr(retriever, "search_kwargs", {}).get("k")
+            key = self.retrieval_cache.make_key(project_name, question, k, self.index_version(project_name))
+            with span("query.retrieve"):
+                docs = self.retrieval_cache.get(key)
+                if docs is None:
+                    with span("query.vector_search"):
+                        docs = retriever.invoke(question)
+                    self.retrieval_cache.put(key, docs)
+        return docs
+
     def list_projects(self) -> List[str]:
-        """List all available projects"""
-        return list(self.projects.keys())
+        """List all available projects, loaded or not"""
+        return list(dict.fromkeys([*self.project_info, *self.projects]))
+
+    def describe_projects(self) -> List[dict]:
+        """read_project_info() for every available project, without importing any of them"""
+        for project_name in self.list_projects():
+            if project_name not in self.project_info:
+                self.project_info[project_name] = self.read_project_info(project_name)
+        return [self.project_info[project_name] for project_name in self.list_projects()]
+
+    def embedding_models(self) -> List[str]:
+        """Distinct embedding models of all projects, read from loaded projects or project.py source"""
+        from model_backends import DEFAULT_EMBEDDING_MODEL
+
+        models = []
+        for info in self.describe_projects():
+            project = self.projects.get(info["name"])
+            models.append(project.embedding_model if project is not None
+                          else info["embedding_model"] or DEFAULT_EMBEDDING_MODEL)
+        return list(dict.fromkeys(models))
+
+    def refresh_project(self, project_name: str, background: bool = False):
+        """Explicitly refresh vector store for a single project.
+
+        With background=True the rebuild runs on its own thread, which is returned;
+        a rebuild already running for the project is returned instead of starting another.
+        """
+        if not background:
+            self.create_vector_store(project_name, force_refresh=True)
+            return None
+
+        def run():
+            try:
+                self.create_vector_store(project_name, force_refresh=True)
+            except Exception as e:
+                print(f"✗ Failed to refresh project {project_name}, still serving the previous store: {e}")
+
+        with self._locks_guard:
+            thread = self.rebuilds.get(project_name)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(target=run, name=f"rebuild-{project_name}", daemon=True)
+            self.rebuilds[project_name] = thread
+        thread.start()
+        return thread
+
+    def start_watcher(self, interval: float = 2.0, debounce: float = 5.0, workers: int = 1, on_change=None):
+        """Poll every project's data.csv and prompt.txt on a background thread
+
+        A settled data.csv change queues an incremental sync of that project on
+        at most workers threads; a prompt.txt change only drops the compiled prompt.
+        """
+        from project_watcher import ProjectWatcher
+
+        if self.watcher is None:
+            self.watcher = ProjectWatcher(self, interval, debounce, workers, on_change).start()
+        return self.watcher
+
+    def stop_watcher(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def rebuilding(self) -> List[str]:
+        """Projects with a background rebuild in progress"""
+        return sorted(name for name, thread in self.rebuilds.items() if thread.is_alive())
+
+    def sync_project(self, project_name: str):
+        """Incrementally sync vector store with data.csv, embedding only changed rows."""
+        self.create_vector_store(project_name, incremental=True)
+
+    def build_all(self, project_names: List[str] = None, workers: int = 3,
+                  embedding_concurrency: int = 4, incremental: bool = False) -> List[dict]:
+        """Build independent projects' vector stores concurrently.
+
+        workers caps how many projects build at once and embedding_concurrency caps
+        in-flight embedding requests across all of them. A failing project is
+        reported in the summary without aborting the others.
+        """
+        project_names = project_names or self.discover_projects()
+        embedding_slots = threading.BoundedSemaphore(max(1, embedding_concurrency))
+
+        def build(project_name: str) -> dict:
+            start = time.perf_counter()
+            result = {"project": project_name, "status": "ok", "rows": 0, "error": None}
+            try:
+                self.create_vector_store(project_name, force_refresh=not incremental, incremental=incremental,
+                                         embedding_slots=embedding_slots)
+                stats = self.get_project(project_name).last_ingest_stats
+                result["rows"] = stats.rows if stats else 0
+            except Exception as e:
+                result["status"] = "failed"
+                result["error"] = str(e)
+                print(f"✗ Failed to build project {project_name}: {e}")
+            result["elapsed"] = time.perf_counter() - start
+            result["rows_per_sec"] = result["rows"] / result["elapsed"] if result["elapsed"] else 0.0
+            return result
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = list(pool.map(build, project_names))
+        total_elapsed = time.perf_counter() - start
 
-    def refresh_project(self, project_name: str):
-        """Explicitly refresh vector store for a single project."""
-        self.create_vector_store(project_name, force_refresh=True)
+        print(f"\n{'Project':<25} {'Status':<8} {'Rows':>10} {'Elapsed':>10} {'Rows/sec':>10}")
+        for r in results:
+            print(f"{r['project']:<25} {r['status']:<8} {r['rows']:>10} {r['elapsed']:>9.1f}s {r['rows_per_sec']:>10.1f}")
+        print(f"Built {sum(r['status'] == 'ok' for r in results)}/{len(results)} projects in {total_elapsed:.1f}s "
+              f"(sum of project times {sum(r['elapsed'] for r in results):.1f}s)")
+        return results
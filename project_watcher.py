@@ -0,0 +1,138 @@
+"""
+Background watcher that keeps project stores and prompts in step with their files
+
+Every interval seconds each project's data.csv and prompt.txt are stat()ed. A
+change in mtime or size starts a debounce timer that restarts on every further
+change. Once a file has stayed unchanged for debounce seconds, its contents are
+hashed, so a touch or a save without edits is ignored. A changed data.csv queues
+an incremental sync of that project on a small worker pool. A changed prompt.txt
+only drops the project's compiled prompt.
+"""
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Watched file -> kind of change reported to on_change
+WATCHED_FILES = {"data.csv": "data", "prompt.txt": "prompt"}
+
+
+def file_stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_digest(path: str) -> Optional[str]:
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class ProjectWatcher:
+    """Polls project files and syncs or reloads the affected project once a change settles
+
+    At most workers syncs run at once, and a project already waiting for a sync
+    isn't queued twice (the queued sync reads the latest data.csv anyway).
+    on_change(project_name, kind) is called for every change acted on, with kind
+    "data" or "prompt".
+    """
+
+    def __init__(self, manager, interval: float = 2.0, debounce: float = 5.0, workers: int = 1,
+                 on_change: Optional[Callable[[str, str], None]] = None):
+        self.manager = manager
+        self.interval = interval
+        self.debounce = debounce
+        self.on_change = on_change
+        # path -> [(mtime_ns, size), digest of the contents last acted on]
+        self._files: Dict[str, list] = {}
+        # (project, filename) -> monotonic time of the latest change seen
+        self._pending: Dict[Tuple[str, str], float] = {}
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="watch-sync")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="project-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        self._pool.shutdown(wait=wait)
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"✗ Project watcher poll failed: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def _path(self, project_name: str, filename: str) -> str:
+        return os.path.join(self.manager.projects_dir, project_name, filename)
+
+    def poll(self, now: float = None):
+        """Record file changes, then act on those that have settled for debounce seconds"""
+        now = time.monotonic() if now is None else now
+        for project_name in self.manager.discover_projects():
+            for filename in WATCHED_FILES:
+                path = self._path(project_name, filename)
+                stat = file_stat(path)
+                known = self._files.get(path)
+                if known is None:
+                    # First sighting is the baseline, whatever the store currently holds
+                    self._files[path] = [stat, file_digest(path)]
+                elif stat != known[0]:
+                    known[0] = stat
+                    self._pending[(project_name, filename)] = now
+
+        for (project_name, filename), changed_at in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            del self._pending[(project_name, filename)]
+            path = self._path(project_name, filename)
+            digest = file_digest(path)
+            if digest is None or digest == self._files[path][1]:
+                continue
+            self._files[path][1] = digest
+            self._dispatch(project_name, WATCHED_FILES[filename])
+
+    def _dispatch(self, project_name: str, kind: str):
+        if kind == "prompt":
+            project = self.manager.projects.get(project_name)
+            if project is not None:
+                project.invalidate_prompt_template()
+            print(f"✓ prompt.txt changed for {project_name}; the new prompt applies from the next query")
+        else:
+            with self._lock:
+                if project_name in self._queued:
+                    return
+                self._queued.add(project_name)
+            print(f"data.csv changed for {project_name}; queued a background sync")
+            self._pool.submit(self._sync, project_name)
+        if self.on_change is not None:
+            self.on_change(project_name, kind)
+
+    def _sync(self, project_name: str):
+        with self._lock:
+            self._queued.discard(project_name)
+        try:
+            self.manager.sync_project(project_name)
+        except Exception as e:
+            print(f"✗ Background sync failed for {project_name}, still serving the previous store: {e}")
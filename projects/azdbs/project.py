@@ -3,6 +3,7 @@ AZDBS Project - A-Z Databases analysis
 """
 import pandas as pd
 import os
+from typing import List
 import sys
 from pathlib import Path
 from langchain_core.documents import Document
@@ -15,6 +16,16 @@ from base_project import BaseProject
 
 class AZDBSProject(BaseProject):
     """A-Z Databases project"""
+
+    vector_backend = "flat"
+    retrieval_mode = "hybrid"
+    exact_match_fields = ["page_content"]
+    # The prompt needs each database's description and location for proxy links
+    context_token_budget = 1500
+    context_metadata_fields = ["description", "location"]
+    prompt_layout = "prefix"
+    # Database titles are unique, so a sync only touches databases that were added, edited or removed
+    id_columns = ["title"]
     
     def process_row(self, row: pd.Series, index: int) -> Document:
         """Process A-Z Databases row with database metadata"""
@@ -31,6 +42,18 @@ class AZDBSProject(BaseProject):
         metadata = {k: v for k, v in metadata.items() if v and v != 'nan' and v.strip()}
         
         return Document(page_content=page_content, metadata=metadata, id=str(index))
+
+    def process_frame(self, df: pd.DataFrame) -> List[Document]:
+        """Column-wise equivalent of process_row for a chunk of rows"""
+        titles = df['title'].astype(str).tolist()
+        metadatas = self.frame_metadata({
+            "description": df['description'],
+            "location": df['location']
+        })
+        return [
+            Document(page_content=title, metadata=metadata, id=str(index))
+            for index, title, metadata in zip(df.index, titles, metadatas)
+        ]
     
     def get_prompt_template(self) -> ChatPromptTemplate:
         """Load prompt template from file or use default"""
@@ -62,7 +85,7 @@ Analyze the student's research topic and provide strategic database recommendati
 4. **Assess Interdisciplinary Aspects**: Identify if the topic spans multiple disciplines
 
 ### Selection Strategy:
-Select 3-5 most relevant databases from the candidate list above, prioritizing:
+Select 3-5 most relevant databases from the candidate list, prioritizing:
 - **Subject coverage alignment** with the research topic
 - **Content type appropriateness** for the research level and methodology
 - **Complementary coverage** to provide comprehensive search options
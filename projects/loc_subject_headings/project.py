@@ -3,6 +3,7 @@ LCSH Variant Labels Project - Library of Congress Subject Headings variant analy
 """
 import pandas as pd
 import os
+from typing import List
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from base_project import BaseProject
@@ -10,6 +11,19 @@ from base_project import BaseProject
 
 class LCSHVariantProject(BaseProject):
     """LCSH Variant Labels project"""
+
+    retrieval_mode = "hybrid"
+    exact_match_fields = ["authoritative_label"]
+    use_ann_index = True
+    ann_nprobe = 16
+    context_token_budget = 2000
+    context_metadata_fields = ["lcsh_id"]
+    prompt_layout = "prefix"
+    rerank_fetch_k = 20
+    # One document per heading, so there is nothing to collapse; MMR alone spreads the results
+    mmr_lambda = 0.8
+    # Authority id, so a sync only touches headings that were added, edited or removed
+    id_columns = ["id"]
     
     def process_row(self, row: pd.Series, index: int) -> Document:
         """Process LCSH variant labels row"""
@@ -32,6 +46,25 @@ class LCSHVariantProject(BaseProject):
         metadata = {k: v for k, v in metadata.items() if v and v != 'nan' and v.strip()}
 
         return Document(page_content=page_content, metadata=metadata, id=str(index))
+
+    def process_frame(self, df: pd.DataFrame) -> List[Document]:
+        """Column-wise equivalent of process_row for a chunk of rows"""
+        contents = df['full_context'].astype(str).tolist()
+        metadatas = self.frame_metadata({
+            "lcsh_id": df['id'],
+            "authoritative_label": df['authoritative_label'],
+            "variant_labels": df['variant_labels'],
+            "broader_authorities": df['broader_authorities'],
+            "narrower_authorities": df['narrower_authorities'],
+            "related_authorities": df['related_authorities'],
+            "classification": df['classification'],
+            "marc_key": df['marc_key'],
+            "sources_and_notes": df['sources_and_notes']
+        })
+        return [
+            Document(page_content=content, metadata=metadata, id=str(index))
+            for index, content, metadata in zip(df.index, contents, metadatas)
+        ]
     
     def get_prompt_template(self) -> ChatPromptTemplate:
         """Load prompt template from file or use default"""
@@ -116,7 +149,7 @@ Analyze the student's research topic and provide strategic subject heading recom
 Remember: Your goal is not just to match keywords, but to leverage the rich hierarchical and relational structure 
 of LCSH to guide the researcher toward the most productive search strategies for their specific academic inquiry.
 
-You must only return subject headings from the list above. Do not invent or modify any headings. 
+You must only return subject headings from the candidate list. Do not invent or modify any headings. 
 If none are relevant, return an empty list.
 """
         
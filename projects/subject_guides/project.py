@@ -2,16 +2,46 @@
 Subject Guides Project - Library Subject Guides RAG vector store creation
 Refactored for CSV data structure from subject_guides_2_truncated.csv
 """
+import re
+import numpy as np
 import pandas as pd
 import os
+from typing import List
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from base_project import BaseProject
 
 
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+WHITESPACE_RE = re.compile(r'\s+')
+HTML_ENTITIES = [
+    ('&amp;', '&'),
+    ('&lt;', '<'),
+    ('&gt;', '>'),
+    ('&quot;', '"'),
+    ('&#39;', "'"),
+    ('&nbsp;', ' '),
+]
+MAX_SECTION_CONTENT = 2000
+
+
 class SubjectGuidesProject(BaseProject):
     """Subject Guides project for creating RAG vector store from CSV data"""
 
+    # Sections are up to 2000 characters each; the prompt builds guide URLs from the shortform
+    # and cites the guide's title and librarian
+    context_token_budget = 1500
+    context_metadata_fields = ["subject_title", "subject_shortform", "staff_firstname", "staff_lastname",
+                               "staff_email", "department_name"]
+    prompt_layout = "prefix"
+    # Many rows are sections of one guide: over-fetch and keep one section per guide
+    rerank_fetch_k = 20
+    group_key = "subject_id"
+    # subject_id, tab_name, section_title: a repeated section is dropped across the whole file
+    duplicate_row_columns = [0, 6, 7]
+    # The same columns identify a section across edits of the file
+    id_columns = [0, 6, 7]
+
     def process_row(self, row: pd.Series, index: int) -> Document:
         """Process subject guides row to create rich context for RAG"""
 
@@ -79,8 +109,8 @@ class SubjectGuidesProject(BaseProject):
         # Add section content (truncate if very long)
         if section_content:
             clean_content = self._clean_html_content(section_content)
-            if len(clean_content) > 2000:
-                clean_content = clean_content[:2000] + "..."
+            if len(clean_content) > MAX_SECTION_CONTENT:
+                clean_content = clean_content[:MAX_SECTION_CONTENT] + "..."
             content_parts.append(f"Content: {clean_content}")
 
         # Join all parts with newlines for rich context
@@ -157,25 +187,119 @@ class SubjectGuidesProject(BaseProject):
 
     def _clean_html_content(self, content: str) -> str:
         """Clean HTML content for better readability"""
-        import re
-
         # Remove HTML tags but keep text content
-        content = re.sub(r'<[^>]+>', ' ', content)
+        content = HTML_TAG_RE.sub(' ', content)
 
         # Replace HTML entities
-        content = content.replace('&amp;', '&')
-        content = content.replace('&lt;', '<')
-        content = content.replace('&gt;', '>')
-        content = content.replace('&quot;', '"')
-        content = content.replace('&#39;', "'")
-        content = content.replace('&nbsp;', ' ')
+        for entity, char in HTML_ENTITIES:
+            content = content.replace(entity, char)
 
         # Clean up whitespace
-        content = re.sub(r'\s+', ' ', content)
+        content = WHITESPACE_RE.sub(' ', content)
         content = content.strip()
 
         return content
 
+    def process_frame(self, df: pd.DataFrame) -> List[Document]:
+        """Column-wise equivalent of process_row for a chunk of rows"""
+        col = lambda column_index: self._frame_column(df, column_index)
+
+        subject_id = col(0)
+        subject_title = col(1)
+        subject_shortform = col(2)
+        subject_description = col(3)
+        tab_name = col(6)
+        section_title = col(7)
+        section_content = col(8)
+        staff_id = col(10)
+        staff_lastname = col(11)
+        staff_firstname = col(12)
+        staff_email = col(13)
+        staff_title = col(14)
+        staff_phone = col(15)
+        department_id = col(17)
+        department_name = col(18)
+
+        has_staff_name = (staff_firstname != "") & (staff_lastname != "")
+        staff_name = staff_firstname + " " + staff_lastname
+
+        clean_content = self._clean_html_frame(section_content)
+        clean_content = clean_content.where(
+            clean_content.str.len() <= MAX_SECTION_CONTENT,
+            clean_content.str[:MAX_SECTION_CONTENT] + "..."
+        )
+
+        # Same labelled parts as process_row, joined with blank lines, skipping empty ones
+        content_parts = [
+            self._prefixed("Subject Guide: ", subject_title),
+            self._prefixed("Description: ", subject_description),
+            self._prefixed("Tab: ", tab_name),
+            self._prefixed("Section: ", section_title),
+            ("Subject Librarian: " + staff_name).where(has_staff_name, ""),
+            self._prefixed("Librarian Email: ", staff_email),
+            self._prefixed("Department: ", department_name),
+            ("Content: " + clean_content).where(section_content != "", ""),
+        ]
+        page_content = content_parts[0]
+        for part in content_parts[1:]:
+            separator = np.where((page_content != "") & (part != ""), "\n\n", "")
+            page_content = page_content + separator + part
+        fallback = "Subject Guide Entry " + pd.Series(df.index, index=df.index).astype(str)
+        page_content = page_content.where(page_content.str.strip() != "", fallback)
+
+        has_email_contact = (staff_email != "") & has_staff_name
+        metadata_columns = {
+            'subject_id': subject_id,
+            'subject_title': subject_title,
+            'subject_shortform': subject_shortform,
+            'guide_url': self._prefixed("https://guides.library.miami.edu/", subject_shortform),
+            'subject_description': subject_description,
+            'tab_name': tab_name,
+            'section_title': section_title,
+            'staff_firstname': staff_firstname,
+            'staff_lastname': staff_lastname,
+            'staff_email': staff_email,
+            'staff_contact_html': (
+                staff_name + ", <a href=\"mailto:" + staff_email + "\">" + staff_email + "</a>"
+            ).where(has_email_contact, ""),
+            'staff_title': staff_title,
+            'staff_phone': staff_phone,
+            'department_name': department_name,
+            'staff_id': staff_id,
+            'department_id': department_id,
+        }
+        keys = list(metadata_columns)
+        metadatas = [
+            {k: v for k, v in zip(keys, values) if v}
+            for values in zip(*(series.tolist() for series in metadata_columns.values()))
+        ]
+
+        return [
+            Document(page_content=content, metadata=metadata, id=str(index))
+            for index, content, metadata in zip(df.index, page_content.tolist(), metadatas)
+        ]
+
+    @staticmethod
+    def _frame_column(df: pd.DataFrame, column_index: int) -> pd.Series:
+        """Column-wise _get_column_value: stripped strings, empty where missing"""
+        if df.shape[1] <= column_index:
+            return pd.Series("", index=df.index)
+        column = df.iloc[:, column_index]
+        text = column.astype(str).str.strip()
+        return text.where(column.notna(), "")
+
+    @staticmethod
+    def _prefixed(prefix: str, values: pd.Series) -> pd.Series:
+        return (prefix + values).where(values != "", "")
+
+    @staticmethod
+    def _clean_html_frame(content: pd.Series) -> pd.Series:
+        """Column-wise _clean_html_content"""
+        content = content.str.replace(HTML_TAG_RE, ' ', regex=True)
+        for entity, char in HTML_ENTITIES:
+            content = content.str.replace(entity, char, regex=False)
+        return content.str.replace(WHITESPACE_RE, ' ', regex=True).str.strip()
+
     def get_prompt_template(self) -> ChatPromptTemplate:
         """Load prompt template from file or use default"""
         if os.path.exists(self.prompt_file):
@@ -200,7 +324,7 @@ comprehensive database of library subject guides, each containing curated resour
 Analyze the user's request and recommend the most relevant subject guides that will best support their research and learning objectives.
 
 ### CRITICAL REQUIREMENTS:
-- **ONLY recommend guides that appear in the "Available Subject Guides" section above**
+- **ONLY recommend guides that appear in the "Available Subject Guides" section**
 - **NEVER create, invent, or modify any guide information**
 - **ALL URLs must use the exact shortform from the metadata, converted to lowercase**
 - **If no guides are sufficiently relevant, say so explicitly and suggest alternatives**
@@ -313,23 +437,8 @@ Remember: Accuracy is more important than completeness. It's better to recommend
 
     def preprocess_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """Preprocess the CSV data before creating documents"""
-        # Remove completely empty rows
-        df = df.dropna(how='all')
-
-        # The CSV doesn't have proper headers, so we'll work with positional columns
-        # Ensure we have enough columns (the CSV has 303 columns)
-        expected_columns = 303
-        if df.shape[1] < expected_columns:
-            # Add missing columns filled with empty strings
-            for i in range(df.shape[1], expected_columns):
-                df[f'col_{i}'] = ""
-
-        # Remove duplicate entries based on subject_id, tab, and section
-        # This helps reduce redundant content while keeping unique sections
-        duplicate_cols = [0, 6, 7]  # subject_id, tab_name, section_title
-        df = df.drop_duplicates(subset=duplicate_cols, keep='first')
-
-        return df
+        # Remove completely empty rows; missing trailing columns are read as empty by _frame_column
+        return df.dropna(how='all')
 
     def get_collection_name(self) -> str:
         """Return the collection name for this project"""
@@ -0,0 +1,56 @@
+"""
+Prefix-stable prompt layout
+
+Local LLM servers such as Ollama (llama.cpp) keep the KV cache of the previous
+prompt and only prefill the tokens after the longest common prefix. The project
+prompts put {responses} and {question} in the middle of several kilobytes of
+static instructions, so everything after them is re-processed on every query.
+prefix_stable() moves the sections holding those variables to the end, making
+the instructions an identical prefix across queries.
+"""
+import re
+from typing import List, Sequence
+from langchain_core.prompts import ChatPromptTemplate
+
+
+SECTION_RE = re.compile(r"^(?=## )", re.MULTILINE)
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+VARIABLE_RE = re.compile(r"(?<!\{)\{(\w+)\}(?!\})")
+
+
+def split_sections(text: str) -> List[str]:
+    """Split at level-2 markdown headers, or at blank lines if the text has none
+
+    Deeper headers (###) stay with their parent section.
+    """
+    if SECTION_RE.search(text):
+        return [section for section in SECTION_RE.split(text) if section.strip()]
+    return [paragraph for paragraph in PARAGRAPH_RE.split(text) if paragraph.strip()]
+
+
+def reorder_text(text: str, variables: Sequence[str] = ("responses", "question")) -> str:
+    """Static sections first in their original order, then the sections using any of variables"""
+    static, variable = [], []
+    for section in split_sections(text):
+        uses = set(VARIABLE_RE.findall(section))
+        (variable if uses.intersection(variables) else static).append(section.strip("\n"))
+    if not static or not variable:
+        return text
+    return "\n\n".join(static + variable) + "\n"
+
+
+def prefix_stable(template: ChatPromptTemplate,
+                  variables: Sequence[str] = ("responses", "question")) -> ChatPromptTemplate:
+    """Rebuild a single-message f-string template with its variable sections moved to the end
+
+    Other templates (several messages, other formats) are returned unchanged.
+    """
+    if len(template.messages) != 1:
+        return template
+    prompt = getattr(template.messages[0], "prompt", None)
+    if getattr(prompt, "template_format", None) != "f-string":
+        return template
+    text = reorder_text(prompt.template, variables)
+    if text == prompt.template:
+        return template
+    return ChatPromptTemplate.from_template(text)
@@ -0,0 +1,104 @@
+"""
+Diversity re-ranking of over-fetched retrieval candidates
+
+The wrapped retriever fetches fetch_k candidates. Their stored vectors are compared
+to the query and to each other in two matrix products. Maximal marginal relevance
+then picks k of them greedily, one vectorized pass per pick, optionally allowing
+at most max_per_group results with the same value of a metadata group key (for
+example the sections of one subject guide).
+"""
+from typing import List, Optional, Sequence
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from metrics import span
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr(query_vector, candidate_vectors, k: int, lambda_mult: float = 0.7,
+        groups: Optional[Sequence] = None, max_per_group: int = 1) -> List[int]:
+    """Indices of k candidates chosen by maximal marginal relevance
+
+    Each pick maximises lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, picked).
+    With groups (one label per candidate), a group that already has max_per_group
+    picks is excluded from later picks, until no other group is left.
+    """
+    candidates = _unit_rows(candidate_vectors)
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    relevance = candidates @ _unit_rows(query_vector)
+    similarity = candidates @ candidates.T
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    if groups is not None:
+        _, codes = np.unique(np.asarray(groups, dtype=object).astype(str), return_inverse=True)
+        group_counts = np.zeros(codes.max() + 1, dtype=np.int32)
+
+    picked = []
+    while len(picked) < k:
+        if not available.any():
+            # Collapsing ran out of groups; fill the remaining slots by plain MMR
+            available = np.ones(n, dtype=bool)
+            available[picked] = False
+            groups = None
+            if not available.any():
+                break
+        # Nothing picked yet: redundancy is -inf, so rank on relevance alone
+        penalty = np.where(np.isneginf(redundancy), 0.0, redundancy)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        if groups is not None:
+            group_counts[codes[best]] += 1
+            if group_counts[codes[best]] >= max_per_group:
+                available &= codes != codes[best]
+    return picked
+
+
+class RerankingRetriever(BaseRetriever):
+    """Over-fetches from retriever, then returns k diverse documents by MMR and group collapsing
+
+    vector_store supplies the candidates' stored vectors (get_vectors) and the
+    query embedding (embeddings.embed_query, usually a cache hit by now).
+    Queries the wrapped retriever answers by exact lookup (is_exact_match) are
+    returned as ranked, cut to k, so they still never call the embedding model.
+    """
+
+    retriever: object
+    vector_store: object
+    search_kwargs: dict = {"k": 5}
+    lambda_mult: float = 0.7
+    group_key: Optional[str] = None
+    max_per_group: int = 1
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        k = self.search_kwargs.get("k", 5)
+        candidates = self.retriever.invoke(query)
+        if not candidates:
+            return []
+        is_exact_match = getattr(self.retriever, "is_exact_match", None)
+        if is_exact_match is not None and is_exact_match(query):
+            return candidates[:k]
+        with span("query.rerank"):
+            vectors = self.vector_store.get_vectors([doc.id for doc in candidates])
+            # Candidates whose vectors can't be read back keep their place after the re-ranked ones
+            known = [i for i, vector in enumerate(vectors) if vector is not None]
+            groups = None
+            if self.group_key:
+                groups = [candidates[i].metadata.get(self.group_key, candidates[i].id) for i in known]
+            order = mmr(self.vector_store.embeddings.embed_query(query), [vectors[i] for i in known], k,
+                        self.lambda_mult, groups, self.max_per_group)
+            ranked = [candidates[known[i]] for i in order]
+            if len(ranked) < k and len(known) < len(candidates):
+                unknown = set(range(len(candidates))) - set(known)
+                ranked += [candidates[i] for i in sorted(unknown)][:k - len(ranked)]
+        return ranked
@@ -0,0 +1,78 @@
+"""
+In-process LRU/TTL cache of retrieval results
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, ignoring trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip(" ?.!")
+
+
+class RetrievalCache:
+    """LRU cache of retrieved documents keyed by (project, normalized question, k, index version)
+
+    Entries also expire after ttl seconds. Bumping a project's index version makes
+    its old entries unreachable; invalidate() drops them eagerly.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(project_name: str, question: str, k: int, index_version: str) -> tuple:
+        return (project_name, normalize_question(question), k, index_version)
+
+    def get(self, key: tuple) -> Optional[List]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key: tuple, documents: List):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(documents))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, project_name: str) -> int:
+        """Drop every cached result for a project, returning how many were removed"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == project_name]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,271 @@
+"""
+Async HTTP query service on top of MultiProjectApp
+
+Endpoints (JSON in, JSON out):
+    GET  /health                                  liveness and in-flight counters
+    GET  /projects                                list available projects and their descriptions
+    GET  /metrics                                 per-stage latency histograms (Prometheus text)
+    POST /query    {"project": ..., "question": ...}
+    POST /refresh  {"project": ..., "mode": "sync" | "rebuild"}
+
+Blocking retrieval and generation run on a thread pool; retrievers and model
+clients stay warm between requests, and an asyncio semaphore caps concurrent
+LLM calls. Start with --backend stub to serve and load-test without Ollama.
+"""
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Union
+from main import (MultiProjectApp, add_answer_cache_arguments, add_model_arguments, add_watch_arguments,
+                  answer_cache_options, apply_model_arguments, apply_watch_arguments)
+from metrics import REGISTRY
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RAGService:
+    """Serves project queries over HTTP with bounded LLM concurrency"""
+
+    def __init__(self, app: MultiProjectApp, max_llm_calls: int = 4, workers: int = 16):
+        self.app = app
+        self.max_llm_calls = max_llm_calls
+        self.llm_slots = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-worker")
+        self.refreshing = set()
+        self.in_flight = 0
+        self.served = 0
+
+    async def run_blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def warm_up(self, preload: bool = False, load_models: bool = True):
+        """Create the LLM client and, optionally, every project's retriever before serving
+
+        With load_models the model server loads the LLM and embedding models in the background.
+        """
+        self.llm_slots = asyncio.Semaphore(self.max_llm_calls)
+        await self.run_blocking(lambda: self.app.model)
+        if load_models:
+            self.app.warm_up_models()
+        if preload:
+            for project_name in self.app.project_manager.list_projects():
+                try:
+                    await self.run_blocking(self.app.project_manager.get_retriever, project_name)
+                    print(f"✓ Warmed retriever for project: {project_name}")
+                except Exception as e:
+                    print(f"✗ Failed to warm project {project_name}: {e}")
+
+    # Endpoints
+
+    async def health(self, body: dict) -> dict:
+        return {"status": "ok", "in_flight": self.in_flight, "served": self.served,
+                "refreshing": sorted(self.refreshing | set(self.app.project_manager.rebuilding())),
+                "retrieval_cache": self.app.project_manager.retrieval_cache.stats(),
+                "answer_cache": self.app.answer_cache.stats() if self.app.answer_cache else None,
+                "model_warm_up": self.app.warm_up_results}
+
+    async def metrics(self, body: dict) -> str:
+        return REGISTRY.to_prometheus()
+
+    async def list_projects(self, body: dict) -> dict:
+        return {"projects": self.app.project_manager.list_projects(),
+                "details": self.app.project_manager.describe_projects()}
+
+    async def query(self, body: dict) -> dict:
+        project_name, question = body.get("project"), body.get("question")
+        if not project_name or not question:
+            raise HTTPError(400, "Both 'project' and 'question' are required")
+        if project_name not in self.app.project_manager.list_projects():
+            raise HTTPError(404, f"Project '{project_name}' not found")
+
+        start = time.perf_counter()
+        # Load the project and its retriever outside the LLM cap so cold projects don't hold a slot
+        await self.run_blocking(self.app.project_manager.get_retriever, project_name)
+        async with self.llm_slots:
+            queued = time.perf_counter() - start
+            if project_name == "lcsh_variant_labels":
+                answer, labels = await self.run_blocking(
+                    lambda: self.app.query_project_labels(project_name, question, stream=False))
+            else:
+                answer = await self.run_blocking(
+                    lambda: self.app.query_project(project_name, question, stream=False))
+                labels = None
+
+        response = {"project": project_name, "question": question, "answer": answer,
+                    "seconds": time.perf_counter() - start, "queued_seconds": queued}
+        if labels is not None:
+            response["labels"] = labels
+        return response
+
+    async def refresh(self, body: dict) -> dict:
+        project_name = body.get("project")
+        mode = body.get("mode", "sync")
+        if project_name not in self.app.project_manager.list_projects():
+            raise HTTPError(404, f"Project '{project_name}' not found")
+        if mode not in ("sync", "rebuild"):
+            raise HTTPError(400, "mode must be 'sync' or 'rebuild'")
+
+        if mode == "rebuild" and body.get("wait") is False:
+            # Queries keep using the current store; /health lists the project until the swap
+            self.app.project_manager.refresh_project(project_name, background=True)
+            return {"project": project_name, "mode": mode, "status": "started"}
+
+        self.refreshing.add(project_name)
+        start = time.perf_counter()
+        try:
+            if mode == "sync":
+                await self.run_blocking(self.app.project_manager.sync_project, project_name)
+            else:
+                await self.run_blocking(self.app.project_manager.refresh_project, project_name)
+        finally:
+            self.refreshing.discard(project_name)
+        return {"project": project_name, "mode": mode, "seconds": time.perf_counter() - start}
+
+    # HTTP plumbing
+
+    def routes(self):
+        return {
+            ("GET", "/health"): self.health,
+            ("GET", "/projects"): self.list_projects,
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/query"): self.query,
+            ("POST", "/refresh"): self.refresh,
+        }
+
+    async def dispatch(self, method: str, path: str, raw_body: bytes) -> Tuple[int, Union[dict, str]]:
+        routes = self.routes()
+        handler = routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in routes):
+                return 405, {"error": f"{method} not allowed on {path}"}
+            return 404, {"error": f"No route for {path}"}
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+            if not isinstance(body, dict):
+                raise HTTPError(400, "Request body must be a JSON object")
+            self.in_flight += 1
+            try:
+                return 200, await handler(body)
+            finally:
+                self.in_flight -= 1
+                self.served += 1
+        except json.JSONDecodeError as e:
+            return 400, {"error": f"Invalid JSON: {e}"}
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests on one connection, honouring keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.write_response(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get("content-length") or "0"
+                if not length.isdecimal():
+                    await self.write_response(writer, 400, {"error": "Invalid Content-Length"}, keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await self.write_response(writer, 413, {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method.upper(), path.split("?", 1)[0], body)
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+                await self.write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def write_response(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        # Handlers return dicts as JSON; plain strings go out as text (the Prometheus endpoint)
+        if isinstance(payload, str):
+            data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def serve(self, host: str, port: int, preload: bool = False, load_models: bool = True):
+        await self.warm_up(preload, load_models)
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_BODY_BYTES)
+        print(f"Serving {', '.join(self.app.project_manager.list_projects())} on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async HTTP query service for the multi-project RAG system")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-llm-calls", type=int, default=4, help="Concurrent LLM generations")
+    parser.add_argument("--workers", type=int, default=16, help="Threads for blocking retrieval and generation")
+    parser.add_argument("--preload", action="store_true", help="Open every project's vector store at startup")
+    parser.add_argument("--backend", choices=["ollama", "stub"], default=None,
+                        help="Model backend (default: RAG_MODEL_BACKEND or ollama)")
+    parser.add_argument("--stub-latency", type=float, default=0.0,
+                        help="Simulated stub LLM prefill latency in seconds")
+    parser.add_argument("--stub-token-latency", type=float, default=0.0,
+                        help="Simulated stub LLM per-token latency in seconds")
+    parser.add_argument("--stub-load-latency", type=float, default=0.0,
+                        help="Simulated stub model load time in seconds, paid when a model is cold")
+    add_answer_cache_arguments(parser)
+    add_model_arguments(parser)
+    add_watch_arguments(parser)
+    args = parser.parse_args()
+
+    if args.backend:
+        from model_backends import use_backend
+        use_backend(args.backend, prefill_latency=args.stub_latency, token_latency=args.stub_token_latency,
+                    load_latency=args.stub_load_latency)
+    apply_model_arguments(args)
+
+    app = MultiProjectApp(stream=False, **answer_cache_options(args))
+    app.initialize()
+    apply_watch_arguments(app, args)
+    service = RAGService(app, max_llm_calls=args.max_llm_calls, workers=args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port, preload=args.preload, load_models=not args.no_warm_up))
+    except KeyboardInterrupt:
+        print("Server stopped.")
+
+
+if __name__ == "__main__":
+    main()
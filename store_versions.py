@@ -0,0 +1,96 @@
+"""
+Versioned vector store directories for zero-downtime rebuilds
+
+A rebuild writes a new store into a sibling directory, <root>.v<milliseconds>,
+while the live one keeps serving. Activating it rewrites the <root>.current
+pointer file atomically. Stores built before versioning live directly at
+<root>, which stays live until the first versioned rebuild is activated.
+sweep() deletes directories that rebuilds left behind.
+"""
+import os
+import re
+import time
+import shutil
+from typing import Iterable, List, Optional
+
+
+VERSION_SUFFIX_RE = re.compile(r"\.v\d+$")
+
+
+def store_root(location: str) -> str:
+    """Unversioned root of a store location (the location itself for legacy stores)"""
+    return VERSION_SUFFIX_RE.sub("", location)
+
+
+def pointer_file(root: str) -> str:
+    return f"{root}.current"
+
+
+def live_location(root: str) -> str:
+    """Directory the pointer file names, or root when there is no usable pointer"""
+    try:
+        with open(pointer_file(root)) as f:
+            name = f.read().strip()
+    except OSError:
+        return root
+    location = os.path.join(os.path.dirname(root), name)
+    return location if name and os.path.isdir(location) else root
+
+
+def staging_location(location: str) -> str:
+    """A fresh, not yet existing versioned directory next to location"""
+    root = store_root(location)
+    version = int(time.time() * 1000)
+    while os.path.exists(f"{root}.v{version}"):
+        version += 1
+    return f"{root}.v{version}"
+
+
+def activate(location: str) -> Optional[str]:
+    """Point the store's root at location; returns the previously live directory if it differs"""
+    root = store_root(location)
+    previous = live_location(root)
+    pointer = pointer_file(root)
+    tmp = f"{pointer}.tmp"
+    with open(tmp, "w") as f:
+        f.write(os.path.basename(location))
+    os.replace(tmp, pointer)
+    if os.path.normpath(previous) == os.path.normpath(location) or not os.path.exists(previous):
+        return None
+    return previous
+
+
+def remove(location: str):
+    shutil.rmtree(location, ignore_errors=True)
+
+
+def version_of(location: str) -> Optional[int]:
+    """The <milliseconds> of a versioned directory, None for an unversioned one"""
+    match = VERSION_SUFFIX_RE.search(location)
+    return int(match.group()[2:]) if match else None
+
+
+def sweep(root: str, keep: Iterable[str] = ()) -> List[str]:
+    """Delete store directories under root that the pointer no longer names; returns the removed ones
+
+    Only versions older than the live one are removed, plus the unversioned
+    root once a versioned store is live. Newer ones may be a rebuild still in
+    progress, and keep lists retired stores that are still serving queries.
+    """
+    live = live_location(root)
+    live_version = version_of(live)
+    if live_version is None:
+        return []
+    keep = {os.path.normpath(location) for location in (*keep, live)}
+    parent = os.path.dirname(root)
+    prefix = f"{os.path.basename(root)}.v"
+    candidates = [root] + [os.path.join(parent, name) for name in os.listdir(parent or ".")
+                           if name.startswith(prefix) and name[len(prefix):].isdigit()]
+    removed = []
+    for location in candidates:
+        version = version_of(location)
+        if ((version is None or version < live_version) and os.path.normpath(location) not in keep
+                and os.path.isdir(location)):
+            remove(location)
+            removed.append(location)
+    return removed
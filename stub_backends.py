@@ -0,0 +1,129 @@
+"""
+Deterministic stand-ins for the Ollama embedding and LLM models, for offline runs and load tests
+"""
+import os
+import time
+import hashlib
+import threading
+from typing import Any, Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+from context_builder import estimate_tokens
+
+
+class SimulatedLoad:
+    """Model load delay paid on first use and again after keep_alive idle seconds (-1 = never unloaded)"""
+
+    def __init__(self, latency: float = 0.0, keep_alive: float = -1):
+        self.latency = latency
+        self.keep_alive = keep_alive
+        self._last_used = None
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            last, self._last_used = self._last_used, now
+        cold = last is None or (self.keep_alive >= 0 and now - last > self.keep_alive)
+        return self.latency if cold else 0.0
+
+
+class StubEmbeddings(Embeddings):
+    """Hash-seeded unit vectors: the same text always maps to the same vector"""
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0, per_text_latency: float = 0.0,
+                 load_latency: float = 0.0, keep_alive: float = -1):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.load = SimulatedLoad(load_latency, keep_alive)
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _sleep(self, count: int):
+        delay = self.load.delay() + self.latency + self.per_text_latency * count
+        if delay:
+            time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._sleep(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._sleep(1)
+        return self._vector(text)
+
+
+class StubLLM(LLM):
+    """Returns a deterministic answer derived from the prompt after a simulated prefill and decode delay
+
+    Prefill costs prefill_latency plus prefill_token_latency per prompt token. With
+    prefix_cache, tokens shared with the start of the previous prompt are free, like
+    a single llama.cpp slot reusing its KV cache; prefill_stats() reports the totals.
+    load_latency is added on first use and after keep_alive idle seconds.
+    """
+
+    prefill_latency: float = 0.0
+    prefill_token_latency: float = 0.0
+    prefix_cache: bool = False
+    token_latency: float = 0.0
+    answer_tokens: int = 32
+    load_latency: float = 0.0
+    keep_alive: float = -1
+    _load: Any = PrivateAttr(default=None)
+    _last_prompt: str = PrivateAttr(default="")
+    _prompt_tokens: int = PrivateAttr(default=0)
+    _cached_tokens: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self, prompt: str) -> List[str]:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return [f"stub{digest[(4 * i) % 60:(4 * i) % 60 + 4]} " for i in range(self.answer_tokens)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        return "".join(self._stream_tokens(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        for token in self._stream_tokens(prompt):
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _prefill(self, prompt: str) -> float:
+        """Simulated prefill seconds for prompt, updating the prefix cache and counters"""
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            cached = estimate_tokens(os.path.commonprefix([self._last_prompt, prompt])) if self.prefix_cache else 0
+            cached = min(cached, tokens)
+            self._last_prompt = prompt
+            self._prompt_tokens += tokens
+            self._cached_tokens += cached
+            if self._load is None:
+                self._load = SimulatedLoad(self.load_latency, self.keep_alive)
+        return self._load.delay() + self.prefill_latency + self.prefill_token_latency * (tokens - cached)
+
+    def prefill_stats(self) -> dict:
+        with self._lock:
+            return {"prompt_tokens": self._prompt_tokens, "cached_tokens": self._cached_tokens,
+                    "cached_fraction": self._cached_tokens / self._prompt_tokens if self._prompt_tokens else 0.0}
+
+    def _stream_tokens(self, prompt: str) -> Iterator[str]:
+        delay = self._prefill(prompt)
+        if delay:
+            time.sleep(delay)
+        for token in self._tokens(prompt):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield token
@@ -0,0 +1,47 @@
+"""
+Context packing: repeated headers are dropped only within one group, whole duplicates always
+"""
+import os
+import sys
+from langchain_core.documents import Document
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from context_builder import ContextBuilder
+
+
+def section(guide, librarian, text, section_id):
+    header = f"Subject Guide: {guide}\n\nSubject Librarian: {librarian}\n\nDepartment: Richter Library"
+    return Document(page_content=f"{header}\n\nContent: {text}", metadata={"subject_id": guide}, id=section_id)
+
+
+def test_headers_of_different_guides_are_kept():
+    documents = [section("Chemistry", "Ada Lovelace", "Journals", "1"),
+                 section("Music", "Clara Schumann", "Scores", "2")]
+
+    packed = ContextBuilder().build(documents)
+
+    assert packed.documents == 2
+    assert "Clara Schumann" in packed.text
+    assert packed.text.count("Department: Richter Library") == 2
+
+
+def test_repeated_guide_header_is_dropped_within_the_group():
+    documents = [section("Chemistry", "Ada Lovelace", "Journals", "1"),
+                 section("Chemistry", "Ada Lovelace", "Databases", "2"),
+                 section("Music", "Clara Schumann", "Scores", "3")]
+
+    packed = ContextBuilder(group_key="subject_id").build(documents)
+
+    assert packed.text.count("Subject Librarian: Ada Lovelace") == 1
+    assert "Content: Databases" in packed.text
+    assert "Subject Librarian: Clara Schumann" in packed.text
+    assert packed.tokens_saved > 0
+
+
+def test_identical_documents_are_dropped():
+    duplicate = section("Chemistry", "Ada Lovelace", "Journals", "1")
+
+    packed = ContextBuilder(metadata_fields=["subject_id"]).build([duplicate, duplicate.model_copy()])
+
+    assert packed.documents == 1
+    assert packed.dropped == 1
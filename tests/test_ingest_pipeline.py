@@ -0,0 +1,55 @@
+"""
+Repeated document texts are written with their first copy's vector, in batches, as soon as it is stored
+"""
+import os
+import sys
+import pytest
+from langchain_core.documents import Document
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest_pipeline import DuplicateWriter
+
+
+class MemoryStore:
+    def __init__(self):
+        self.vectors = {}
+        self.upserts = []
+
+    def upsert(self, ids, documents, vectors):
+        self.upserts.append(list(ids))
+        self.vectors.update(zip(ids, vectors))
+
+    def get_vectors(self, ids):
+        return [self.vectors.get(doc_id) for doc_id in ids]
+
+
+def doc(doc_id):
+    return Document(page_content="same text", id=doc_id)
+
+
+def test_repeats_are_written_once_their_first_copy_is_stored():
+    store = MemoryStore()
+    writer = DuplicateWriter(store.upsert, store.get_vectors, batch_size=2)
+
+    writer.add("b", doc("b"), "a")
+    writer.write(["a"], [doc("a")], [[1.0, 0.0]])
+    assert store.upserts == [["a"]]
+    writer.add("c", doc("c"), "a")
+    writer.write(["x"], [doc("x")], [[0.0, 1.0]])
+    # Two repeats are ready: flushed with the writer's batch, before the pipeline finishes
+    assert store.upserts == [["a"], ["x"], ["b", "c"]]
+
+    writer.add("d", doc("d"), "x")
+    writer.finish()
+    assert store.upserts[-1] == ["d"]
+    assert store.vectors["d"] == [0.0, 1.0]
+    assert writer.rows == 3
+
+
+def test_repeat_without_a_stored_first_copy_raises():
+    store = MemoryStore()
+    writer = DuplicateWriter(store.upsert, store.get_vectors, batch_size=2)
+    writer.add("b", doc("b"), "a")
+
+    with pytest.raises(RuntimeError, match="No stored vector"):
+        writer.finish()
@@ -0,0 +1,48 @@
+"""
+BM25 index built from streamed postings: CSR layout, scoring and save/load round trip
+"""
+import os
+import sys
+from collections import Counter
+import numpy as np
+from langchain_core.documents import Document
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lexical_index import BM25Index, LexicalIndexBuilder, tokenize
+
+
+TEXTS = ["marine biology of the deep sea", "sea ice and climate", "art history", "marine marine law", ""]
+
+
+def build():
+    builder = LexicalIndexBuilder(["page_content"])
+    for i, text in enumerate(TEXTS):
+        builder.add(f"doc{i}", Document(page_content=text))
+    return builder.build()
+
+
+def test_postings_match_per_document_term_counts():
+    index = build()
+
+    for i, text in enumerate(TEXTS):
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            row = index.vocab[term]
+            start, end = index.indptr[row], index.indptr[row + 1]
+            postings = dict(zip(index.docs[start:end].tolist(), index.tfs[start:end].tolist()))
+            assert postings[i] == tf
+        assert index.doc_lengths[i] == sum(counts.values())
+    assert index.indptr[-1] == sum(len(Counter(tokenize(text))) for text in TEXTS)
+    # Postings within a term stay in document order
+    for row in range(len(index.terms)):
+        assert np.all(np.diff(index.docs[index.indptr[row]:index.indptr[row + 1]]) > 0)
+
+
+def test_search_and_exact_lookup_survive_save_and_load(tmp_path):
+    index = build()
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+
+    assert [doc_id for doc_id, _ in index.search("marine sea", 5)][:2] == ["doc0", "doc3"]
+    assert loaded.search("marine sea", 5) == index.search("marine sea", 5)
+    assert loaded.exact_lookup("Art History!") == ["doc2"]
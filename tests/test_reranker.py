@@ -0,0 +1,103 @@
+"""
+Re-ranking on top of hybrid retrieval: MMR order, group collapsing, and exact lookups that never embed the query
+"""
+import os
+import sys
+import numpy as np
+from langchain_core.documents import Document
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lexical_index import HybridRetriever, LexicalIndexBuilder
+from reranker import RerankingRetriever, mmr
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [1.0, 0.0, 0.0]
+
+
+class MemoryStore:
+    """The slice of the VectorBackend interface the hybrid and re-ranking retrievers use"""
+
+    def __init__(self, documents, vectors):
+        self.embeddings = CountingEmbeddings()
+        self.documents = {doc.id: doc for doc in documents}
+        self.vectors = dict(zip(self.documents, np.asarray(vectors, dtype=np.float32)))
+
+    def similarity_search(self, query, k=4):
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        ranked = sorted(self.documents, key=lambda doc_id: -float(self.vectors[doc_id] @ query_vector))
+        return [self.documents[doc_id] for doc_id in ranked[:k]]
+
+    def get_by_ids(self, ids):
+        return [self.documents[doc_id] for doc_id in ids if doc_id in self.documents]
+
+    def get_vectors(self, ids):
+        return [self.vectors.get(doc_id) for doc_id in ids]
+
+
+def make_retriever(k=2):
+    titles = ["Marine Biology", "Marine Ecology", "Oceanography", "Art History", "Music Index"]
+    documents = [Document(page_content=title, id=str(i)) for i, title in enumerate(titles)]
+    vectors = [[1.0, 0.0, 0.0], [0.9, 0.1, 0.0], [0.8, 0.2, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+    store = MemoryStore(documents, vectors)
+    builder = LexicalIndexBuilder(["page_content"])
+    for doc in documents:
+        builder.add(doc.id, doc)
+    hybrid = HybridRetriever(vector_store=store, lexical_index=builder.build(), search_kwargs={"k": 5}, fetch_k=5)
+    return store, RerankingRetriever(retriever=hybrid, vector_store=store, search_kwargs={"k": k})
+
+
+def test_exact_lookup_with_reranking_makes_no_embedding_call():
+    store, retriever = make_retriever()
+
+    results = retriever.invoke("marine biology")
+
+    assert store.embeddings.calls == 0
+    assert [doc.page_content for doc in results][0] == "Marine Biology"
+    assert len(results) <= 2
+
+
+def test_other_queries_are_reranked_from_embeddings():
+    store, retriever = make_retriever()
+
+    results = retriever.invoke("ocean life")
+
+    assert store.embeddings.calls > 0
+    assert len(results) == 2
+
+
+def test_mmr_trades_relevance_for_diversity():
+    query = [1.0, 0.0]
+    # Two near-duplicates of the query and one relevant but different candidate
+    candidates = [[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]]
+
+    assert mmr(query, candidates, 3, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr(query, candidates, 3, lambda_mult=0.3) == [0, 2, 1]
+    assert mmr(query, candidates, 5, lambda_mult=0.3) == [0, 2, 1]
+
+
+def test_mmr_collapses_groups_then_fills_from_the_rest():
+    query = [1.0, 0.0]
+    candidates = [[1.0, 0.0], [0.95, 0.05], [0.9, 0.1], [0.0, 1.0]]
+    groups = ["guide a", "guide a", "guide b", "guide c"]
+
+    assert mmr(query, candidates, 3, lambda_mult=1.0, groups=groups) == [0, 2, 3]
+    assert mmr(query, candidates, 4, lambda_mult=1.0, groups=groups) == [0, 2, 3, 1]
+    assert mmr(query, candidates, 3, lambda_mult=1.0, groups=groups, max_per_group=2) == [0, 1, 2]
+
+
+def test_reranking_retriever_keeps_one_result_per_group():
+    store, retriever = make_retriever(k=3)
+    for doc in store.documents.values():
+        doc.metadata["area"] = "marine" if doc.page_content.startswith("Marine") else doc.page_content
+    retriever.group_key = "area"
+    retriever.lambda_mult = 1.0
+
+    results = retriever.invoke("ocean life")
+
+    assert [doc.page_content for doc in results] == ["Marine Biology", "Oceanography", "Art History"]
@@ -0,0 +1,137 @@
+"""
+Incremental sync: only added or edited rows are embedded, removed rows are deleted, ids stay stable
+"""
+import os
+import sys
+import shutil
+import pandas as pd
+import pytest
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from base_project import BaseProject
+from model_backends import use_backend
+from project_manager import ProjectManager
+
+
+class NotesProject(BaseProject):
+    """One document per note; no id_columns, so ids are content hashes"""
+
+    vector_backend = "flat"
+
+    def process_row(self, row: pd.Series, index: int) -> Document:
+        return Document(page_content=str(row["text"]), metadata={"topic": str(row["topic"])}, id=str(index))
+
+    def get_prompt_template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_template("{responses}\n{question}")
+
+
+class PositionalNotesProject(NotesProject):
+    """Ids as the row positions stores were built with before stable ids"""
+
+    def iter_documents(self, counts=None):
+        for position, (_, doc) in enumerate(super().iter_documents(counts)):
+            doc.id = str(position)
+            yield doc.id, doc
+
+
+@pytest.fixture(autouse=True)
+def stub_models(tmp_path, monkeypatch):
+    # Stores and the embedding cache are created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    use_backend("stub", dimensions=32)
+    yield
+    use_backend("ollama")
+
+
+def stored_ids(project) -> set:
+    return {doc_id for doc_id, _ in project.open_backend().iter_documents()}
+
+
+def current_ids(project) -> set:
+    return {doc_id for doc_id, _ in project.iter_documents()}
+
+
+def write_notes(project_dir, texts):
+    os.makedirs(project_dir, exist_ok=True)
+    # Topics follow the text, not the row position, so deleting a row leaves the others' content alone
+    pd.DataFrame({"topic": [f"topic {len(text) % 3}" for text in texts], "text": texts}).to_csv(
+        os.path.join(project_dir, "data.csv"), index=False)
+
+
+def test_azdbs_edit_delete_and_add_one_row(tmp_path):
+    projects_dir = tmp_path / "projects"
+    shutil.copytree(os.path.join(ROOT, "projects", "azdbs"), projects_dir / "azdbs")
+    manager = ProjectManager(str(projects_dir))
+    manager.initialize_all_projects()
+    project = manager.get_project("azdbs")
+    project.create_vector_store()
+    before = stored_ids(project)
+
+    csv_file = projects_dir / "azdbs" / "data.csv"
+    df = pd.read_csv(csv_file)
+    rows = len(df)
+    df.loc[0, "description"] = f"{df.loc[0, 'description']} Now with full text."
+    df = df.drop(index=5)
+    df.loc[len(df) + 1] = ["Zebrafish Database", "Genetic data for zebrafish research", "https://zfin.org"]
+    df.to_csv(csv_file, index=False)
+    project.create_vector_store(incremental=True)
+
+    assert project.last_sync_stats == {"changed": 2, "deleted": 1, "unchanged": rows - 2}
+    after = stored_ids(project)
+    assert after == current_ids(project)
+    # Keyed by title: the edited row keeps its id, one id is gone and one is new
+    assert len(before - after) == 1 and len(after - before) == 1
+
+
+def test_content_hash_ids_replace_an_edited_row(tmp_path):
+    project_dir = tmp_path / "notes"
+    write_notes(project_dir, [f"note number {i}" for i in range(20)])
+    project = NotesProject("notes", str(project_dir))
+    project.create_vector_store()
+    before = stored_ids(project)
+
+    texts = [f"note number {i}" for i in range(20)]
+    texts[3] = "note number 3, revised"
+    del texts[7]
+    write_notes(project_dir, texts)
+    project.create_vector_store(incremental=True)
+
+    # The edited note is new content under a new id; rows after the deleted one keep theirs
+    assert project.last_sync_stats == {"changed": 1, "deleted": 2, "unchanged": 18}
+    after = stored_ids(project)
+    assert after == current_ids(project)
+    assert len(before & after) == 18
+
+
+def test_sync_migrates_positional_ids(tmp_path):
+    project_dir = tmp_path / "notes"
+    write_notes(project_dir, [f"note number {i}" for i in range(10)])
+    PositionalNotesProject("notes", str(project_dir)).create_vector_store()
+
+    project = NotesProject("notes", str(project_dir))
+    project.create_vector_store(incremental=True)
+
+    assert project.last_sync_stats == {"changed": 10, "deleted": 10, "unchanged": 0}
+    assert stored_ids(project) == current_ids(project)
+    project.create_vector_store(incremental=True)
+    assert project.last_sync_stats == {"changed": 0, "deleted": 0, "unchanged": 10}
+
+
+def test_loading_a_project_leaves_old_store_versions_for_gc(tmp_path):
+    project_dir = tmp_path / "notes"
+    write_notes(project_dir, [f"note number {i}" for i in range(5)])
+    root = "./chrome_langchain_db_notes"
+    for version in ("1", "2"):
+        os.makedirs(f"{root}.v{version}")
+    with open(f"{root}.current", "w") as f:
+        f.write("chrome_langchain_db_notes.v2")
+
+    project = NotesProject("notes", str(project_dir))
+    # Another process may still be serving v1; only an explicit sweep removes it
+    assert os.path.isdir(f"{root}.v1")
+    project.sweep_stores()
+    assert not os.path.isdir(f"{root}.v1")
+    assert os.path.isdir(f"{root}.v2")
@@ -0,0 +1,74 @@
+"""
+Flat vector backend: generations across persists, deletes, reopening from disk and closing
+"""
+import os
+import sys
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_backends import FlatVectorBackend
+
+
+DIMENSIONS = 8
+
+
+def vector(i):
+    return np.random.default_rng(i).standard_normal(DIMENSIONS).tolist()
+
+
+def upsert(backend, numbers):
+    ids = [f"doc{i}" for i in numbers]
+    documents = [Document(page_content=f"text {i}", metadata={"n": i}, id=f"doc{i}") for i in numbers]
+    backend.upsert(ids, documents, [vector(i) for i in numbers])
+
+
+def generation_files(directory):
+    return sorted(name for name in os.listdir(directory) if name != FlatVectorBackend.MANIFEST_FILE)
+
+
+def test_two_persists_with_deletes_reopen_identically(tmp_path):
+    directory = str(tmp_path / "store")
+    backend = FlatVectorBackend("test", directory, embeddings=None)
+    upsert(backend, range(10))
+    backend.persist()
+    first = backend.generation
+
+    upsert(backend, range(10, 15))
+    upsert(backend, [2])
+    backend.delete(["doc3", "doc11"])
+    backend.persist()
+
+    expected = {f"doc{i}" for i in range(15)} - {"doc3", "doc11"}
+    assert backend.count() == len(expected)
+    # Only the live generation's four files remain, and no spill files
+    assert generation_files(directory) == sorted(
+        os.path.basename(path) for path in backend._store_files(backend.generation))
+    assert backend.generation != first
+
+    reopened = FlatVectorBackend("test", directory, embeddings=None)
+    assert reopened.count() == backend.count()
+    assert {doc_id for doc_id, _ in reopened.iter_documents()} == expected
+    assert reopened.get_by_ids(["doc3", "doc11"]) == []
+    assert [(doc.id, doc.page_content, doc.metadata) for doc in reopened.get_by_ids(["doc2", "doc12"])] == \
+        [("doc2", "text 2", {"n": 2}), ("doc12", "text 12", {"n": 12})]
+    for i in (0, 2, 12, 14):
+        assert [doc.id for doc in reopened.similarity_search_by_vector(vector(i), k=1)] == [f"doc{i}"]
+        assert [doc.id for doc in reopened.similarity_search_by_vector(vector(i), k=3)] == \
+            [doc.id for doc in backend.similarity_search_by_vector(vector(i), k=3)]
+    stored = reopened.get_vectors(["doc5", "doc3"])
+    assert stored[1] is None
+    assert np.allclose(stored[0], np.asarray(vector(5)) / np.linalg.norm(vector(5)), atol=1e-6)
+
+
+def test_closed_backend_raises_a_clear_error(tmp_path):
+    backend = FlatVectorBackend("test", str(tmp_path / "store"), embeddings=None)
+    upsert(backend, range(3))
+    backend.persist()
+    backend.close()
+
+    with pytest.raises(RuntimeError, match="closed"):
+        backend.count()
+    with pytest.raises(RuntimeError, match="closed"):
+        backend.get_by_ids(["doc0"])
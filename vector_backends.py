@@ -0,0 +1,454 @@
+"""
+Vector storage backends: Chroma, and an in-process memory-mapped flat index
+"""
+import os
+import json
+import mmap
+import time
+import tempfile
+import contextlib
+from array import array
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+class VectorBackend(ABC):
+    """Storage and exact search for one project's embedded documents
+
+    Writes (upsert/delete) may be buffered until persist(). Backends also expose
+    similarity_search/get_by_ids so retrievers can use them like a vector store.
+    """
+
+    def __init__(self, collection_name: str, directory: str, embeddings):
+        self.collection_name = collection_name
+        self.directory = directory
+        self.embeddings = embeddings
+
+    @abstractmethod
+    def exists(self) -> bool:
+        """Whether a store has already been written to directory"""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], documents: List[Document], vectors: Sequence):
+        """Insert or replace already-embedded documents"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        pass
+
+    def persist(self):
+        """Make buffered writes durable and visible to searches"""
+
+    def close(self):
+        """Release files and clients before the store directory is deleted"""
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def iter_vectors(self, batch_size: int) -> Iterator[Tuple[List[str], Sequence]]:
+        """Page (ids, embeddings) out of the store"""
+
+    @abstractmethod
+    def iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        """Every stored (id, Document) pair"""
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k)
+
+    @abstractmethod
+    def similarity_search_by_vector(self, vector: Sequence[float], k: int = 4) -> List[Document]:
+        pass
+
+    @abstractmethod
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        pass
+
+    @abstractmethod
+    def get_vectors(self, ids: List[str]) -> List[Optional[np.ndarray]]:
+        """Stored vectors in the order of ids, None for ids not in the store"""
+
+    def as_retriever(self, search_kwargs: Optional[dict] = None) -> BaseRetriever:
+        return VectorSearchRetriever(vector_search=self, search_kwargs=search_kwargs or {"k": 5})
+
+
+class VectorSearchRetriever(BaseRetriever):
+    """Retriever over any object with similarity_search (a backend or an ANN index)"""
+
+    vector_search: object
+    search_kwargs: dict = {"k": 5}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.vector_search.similarity_search(query, k=self.search_kwargs.get("k", 5))
+
+
+class ChromaBackend(VectorBackend):
+    """Persistent Chroma collection"""
+
+    def __init__(self, collection_name: str, directory: str, embeddings):
+        super().__init__(collection_name, directory, embeddings)
+        self._exists = os.path.exists(directory)
+        # chromadb is slow to import, so defer it until a store is actually opened
+        from langchain_chroma import Chroma
+        self.vector_store = Chroma(
+            collection_name=collection_name,
+            persist_directory=directory,
+            embedding_function=embeddings
+        )
+
+    def exists(self) -> bool:
+        return self._exists
+
+    def upsert(self, ids, documents, vectors):
+        # Chroma rejects empty metadata dicts, so those rows go in without metadata
+        with_metadata = [i for i, doc in enumerate(documents) if doc.metadata]
+        without_metadata = [i for i, doc in enumerate(documents) if not doc.metadata]
+        if with_metadata:
+            self.vector_store._collection.upsert(
+                ids=[ids[i] for i in with_metadata],
+                embeddings=[vectors[i] for i in with_metadata],
+                documents=[documents[i].page_content for i in with_metadata],
+                metadatas=[documents[i].metadata for i in with_metadata]
+            )
+        if without_metadata:
+            self.vector_store._collection.upsert(
+                ids=[ids[i] for i in without_metadata],
+                embeddings=[vectors[i] for i in without_metadata],
+                documents=[documents[i].page_content for i in without_metadata]
+            )
+
+    def delete(self, ids):
+        if ids:
+            self.vector_store.delete(ids=ids)
+
+    def close(self):
+        # Chroma shares one system per directory; closing releases it so the files aren't held open
+        client = getattr(self.vector_store, "_client", None)
+        if client is not None and hasattr(client, "close"):
+            client.close()
+
+    def count(self) -> int:
+        return self.vector_store._collection.count()
+
+    def iter_vectors(self, batch_size):
+        offset = 0
+        while True:
+            page = self.vector_store._collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            yield page["ids"], page["embeddings"]
+            offset += len(page["ids"])
+
+    def iter_documents(self):
+        stored = self.vector_store.get(include=["documents", "metadatas"])
+        for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+            yield doc_id, Document(page_content=text or "", metadata=metadata or {}, id=doc_id)
+
+    def similarity_search(self, query, k=4):
+        return self.vector_store.similarity_search(query, k=k)
+
+    def similarity_search_by_vector(self, vector, k=4):
+        return self.vector_store.similarity_search_by_vector(np.asarray(vector, dtype=float).tolist(), k=k)
+
+    def get_by_ids(self, ids):
+        return self.vector_store.get_by_ids(ids)
+
+    def get_vectors(self, ids):
+        # Chroma rejects repeated ids in one get
+        stored = self.vector_store._collection.get(ids=list(dict.fromkeys(ids)), include=["embeddings"])
+        found = dict(zip(stored["ids"], stored["embeddings"]))
+        return [None if found.get(doc_id) is None else np.asarray(found[doc_id], dtype=np.float32) for doc_id in ids]
+
+    def as_retriever(self, search_kwargs=None):
+        return self.vector_store.as_retriever(search_kwargs=search_kwargs or {"k": 5})
+
+
+class FlatVectorBackend(VectorBackend):
+    """Exact cosine search over a memory-mapped float32 matrix
+
+    A store is one generation of four files: vectors.<g>.npy holds unit-length
+    rows, records.<g>.jsonl holds one {"id", "page_content", "metadata"} line
+    per row, located through records_offsets.<g>.npy, and ids.<g>.json lists
+    row ids for lookups by id. manifest.json names the live generation.
+    Opening maps the files without reading the matrix, and a query is a
+    single matrix-vector product.
+
+    Upserts are appended to spill files in the store directory as they
+    arrive, so an ingest keeps only ids in memory. persist() merges the kept
+    rows and the spilled ones into a new generation in CHUNK_ROWS steps, then
+    replaces the manifest atomically, so another instance always opens files
+    of one generation. This suits stores that change in batches.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    RECORDS_FILE = "records.jsonl"
+    OFFSETS_FILE = "records_offsets.npy"
+    IDS_FILE = "ids.json"
+    MANIFEST_FILE = "manifest.json"
+    SPILL_PREFIX = ".pending-"
+    # Rows copied per step when persist() writes a new generation
+    CHUNK_ROWS = 65536
+
+    def __init__(self, collection_name: str, directory: str, embeddings):
+        super().__init__(collection_name, directory, embeddings)
+        # Upserted ids by row in the spill files, and the spill files' record offsets
+        self._pending: Dict[str, int] = {}
+        self._spill = None
+        self._spill_offsets = array("q", [0])
+        self._deleted = set()
+        self._row_of: Optional[Dict[str, int]] = None
+        self._load()
+
+    def _path(self, name: str, generation: Optional[str] = None) -> str:
+        """Path of a store file; generation None is the unversioned layout of older stores"""
+        if generation is not None:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}.{generation}{ext}"
+        return os.path.join(self.directory, name)
+
+    def _store_files(self, generation: Optional[str]) -> List[str]:
+        return [self._path(name, generation)
+                for name in (self.VECTORS_FILE, self.RECORDS_FILE, self.OFFSETS_FILE, self.IDS_FILE)]
+
+    def _live_generation(self) -> Tuple[bool, Optional[str]]:
+        """(whether a store exists, generation named by the manifest or None for the unversioned layout)"""
+        try:
+            with open(self._path(self.MANIFEST_FILE), "r") as f:
+                return True, json.load(f)["generation"]
+        except FileNotFoundError:
+            return all(os.path.exists(path) for path in self._store_files(None)), None
+
+    def _load(self, attempts: int = 3):
+        """Map the live generation's files, re-reading the manifest if a concurrent persist removed them"""
+        for attempt in range(attempts):
+            exists, generation = self._live_generation()
+            try:
+                self._open(exists, generation)
+                return
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+
+    def _open(self, exists: bool, generation: Optional[str]):
+        if not exists:
+            vectors, offsets, ids, records = np.empty((0, 0), dtype=np.float32), np.zeros(1, dtype=np.int64), [], b""
+        else:
+            vectors_path, records_path, offsets_path, ids_path = self._store_files(generation)
+            vectors = np.load(vectors_path, mmap_mode="r")
+            offsets = np.load(offsets_path, mmap_mode="r")
+            # Ids are read with the matrix, so both always come from the same generation
+            with open(ids_path, "r") as f:
+                ids = json.load(f)
+            with open(records_path, "rb") as f:
+                records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+        self._exists, self.generation = exists, generation
+        self.vectors, self.offsets, self.ids, self._records = vectors, offsets, ids, records
+        self._row_of = None
+
+    def exists(self) -> bool:
+        return self._exists
+
+    def upsert(self, ids, documents, vectors):
+        self._require_open()
+        if not ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        spill = self._open_spill(vectors.shape[1])
+        spill["vectors"].write(vectors.tobytes())
+        for doc_id, doc in zip(ids, documents):
+            line = (json.dumps({"id": doc_id, "page_content": doc.page_content,
+                                "metadata": doc.metadata}) + "\n").encode("utf-8")
+            spill["records"].write(line)
+            self._spill_offsets.append(self._spill_offsets[-1] + len(line))
+            self._deleted.discard(doc_id)
+            # A repeated id points at its latest spilled row; the earlier one is skipped by persist()
+            self._pending[doc_id] = spill["rows"]
+            spill["rows"] += 1
+
+    def _open_spill(self, dimensions: int) -> dict:
+        if self._spill is None:
+            os.makedirs(self.directory, exist_ok=True)
+            spill = {"rows": 0, "dimensions": dimensions}
+            for kind in ("vectors", "records"):
+                fd, path = tempfile.mkstemp(prefix=self.SPILL_PREFIX, suffix=f".{kind}", dir=self.directory)
+                spill[kind] = os.fdopen(fd, "w+b")
+                spill[f"{kind}_path"] = path
+            self._spill = spill
+        elif dimensions != self._spill["dimensions"]:
+            raise ValueError(f"Expected {self._spill['dimensions']}-dimensional vectors, got {dimensions}")
+        return self._spill
+
+    def _spilled_vectors(self) -> np.ndarray:
+        spill = self._spill
+        spill["vectors"].flush()
+        return np.memmap(spill["vectors_path"], dtype=np.float32, mode="r",
+                         shape=(spill["rows"], spill["dimensions"]))
+
+    def _discard_spill(self):
+        spill, self._spill = self._spill, None
+        self._pending.clear()
+        self._spill_offsets = array("q", [0])
+        if spill is not None:
+            for kind in ("vectors", "records"):
+                spill[kind].close()
+                with contextlib.suppress(OSError):
+                    os.remove(spill[f"{kind}_path"])
+
+    def delete(self, ids):
+        self._require_open()
+        for doc_id in ids:
+            self._pending.pop(doc_id, None)
+            self._deleted.add(doc_id)
+
+    def close(self):
+        self._discard_spill()
+        if isinstance(self._records, mmap.mmap):
+            self._records.close()
+        self.vectors = self.offsets = None
+        self._records = b""
+
+    def _require_open(self):
+        if self.offsets is None:
+            raise RuntimeError(f"Flat vector backend for {self.directory} is closed")
+
+    def count(self) -> int:
+        self._require_open()
+        return len(self.offsets) - 1
+
+    def _record(self, row: int) -> dict:
+        return json.loads(self._records[self.offsets[row]:self.offsets[row + 1]])
+
+    def _document(self, row: int) -> Document:
+        record = self._record(row)
+        return Document(page_content=record["page_content"], metadata=record["metadata"], id=record["id"])
+
+    @property
+    def row_of(self) -> Dict[str, int]:
+        if self._row_of is None:
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        return self._row_of
+
+    def persist(self):
+        self._require_open()
+        if not self._pending and not self._deleted:
+            return
+        if not self._pending and not self.count():
+            # Deletes against an empty store: nothing to write
+            self._deleted.clear()
+            return
+        replaced = set(self._pending) | self._deleted
+        keep = sorted(row for doc_id, row in self.row_of.items() if doc_id not in replaced) if self.count() else []
+        pending = sorted(self._pending.items(), key=lambda item: item[1])
+        dimensions = self.vectors.shape[1] if self.count() else self._spill["dimensions"]
+        if pending and self._spill["dimensions"] != dimensions:
+            raise ValueError(f"Expected {dimensions}-dimensional vectors, got {self._spill['dimensions']}")
+        total = len(keep) + len(pending)
+
+        generation = f"{time.time_ns():x}"
+        vectors_path, records_path, offsets_path, ids_path = self._store_files(generation)
+        vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(total, dimensions))
+        offsets = np.zeros(total + 1, dtype=np.int64)
+        position = 0
+        with open(records_path, "wb") as records:
+            for start in range(0, len(keep), self.CHUNK_ROWS):
+                rows = keep[start:start + self.CHUNK_ROWS]
+                vectors[start:start + len(rows)] = self.vectors[rows]
+                for i, row in enumerate(rows, start):
+                    line = self._records[self.offsets[row]:self.offsets[row + 1]]
+                    records.write(line)
+                    position += len(line)
+                    offsets[i + 1] = position
+            if pending:
+                spilled = self._spilled_vectors()
+                self._spill["records"].flush()
+                with open(self._spill["records_path"], "rb") as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as spilled_records:
+                    for start in range(0, len(pending), self.CHUNK_ROWS):
+                        rows = [row for _, row in pending[start:start + self.CHUNK_ROWS]]
+                        vectors[len(keep) + start:len(keep) + start + len(rows)] = spilled[rows]
+                        for i, row in enumerate(rows, len(keep) + start):
+                            line = spilled_records[self._spill_offsets[row]:self._spill_offsets[row + 1]]
+                            records.write(line)
+                            position += len(line)
+                            offsets[i + 1] = position
+                del spilled
+        vectors.flush()
+        del vectors
+        with open(offsets_path, "wb") as f:
+            np.save(f, offsets)
+        with open(ids_path, "w") as f:
+            json.dump([self.ids[row] for row in keep] + [doc_id for doc_id, _ in pending], f)
+
+        # Switching the manifest is the commit point; readers see the old generation or the new one
+        manifest_tmp = self._path(f"{self.MANIFEST_FILE}.{generation}.tmp")
+        with open(manifest_tmp, "w") as f:
+            json.dump({"generation": generation, "rows": total}, f)
+        os.replace(manifest_tmp, self._path(self.MANIFEST_FILE))
+
+        previous_exists, previous, previous_records = self._exists, self.generation, self._records
+        self._discard_spill()
+        self._deleted.clear()
+        self._load()
+        if isinstance(previous_records, mmap.mmap):
+            previous_records.close()
+        if previous_exists:
+            # Instances still mapping the old files keep working on POSIX; elsewhere the files stay behind
+            for path in self._store_files(previous):
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+
+    def iter_vectors(self, batch_size):
+        for start in range(0, self.count(), batch_size):
+            end = min(start + batch_size, self.count())
+            yield self.ids[start:end], np.asarray(self.vectors[start:end])
+
+    def iter_documents(self):
+        for row in range(self.count()):
+            doc = self._document(row)
+            yield doc.id, doc
+
+    def similarity_search_by_vector(self, vector, k=4):
+        if not self.count():
+            return []
+        scores = self.vectors @ np.asarray(vector, dtype=np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self._document(row) for row in top]
+
+    def get_by_ids(self, ids):
+        self._require_open()
+        return [self._document(self.row_of[doc_id]) for doc_id in ids if doc_id in self.row_of]
+
+    def get_vectors(self, ids):
+        self._require_open()
+        # Spilled writes first, so vectors upserted before persist() can be read back
+        spilled = self._spilled_vectors() if any(doc_id in self._pending for doc_id in ids) else None
+        vectors = []
+        for doc_id in ids:
+            if doc_id in self._pending:
+                vectors.append(np.array(spilled[self._pending[doc_id]]))
+            elif doc_id in self._deleted or doc_id not in self.row_of:
+                vectors.append(None)
+            else:
+                vectors.append(self.vectors[self.row_of[doc_id]])
+        return vectors
+
+
+VECTOR_BACKENDS = {
+    "chroma": ChromaBackend,
+    "flat": FlatVectorBackend,
+}
+
+
+def open_backend(name: str, collection_name: str, directory: str, embeddings) -> VectorBackend:
+    if name not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend {name!r}, expected one of {', '.join(VECTOR_BACKENDS)}")
+    return VECTOR_BACKENDS[name](collection_name, directory, embeddings)